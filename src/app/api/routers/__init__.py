@@ -3,6 +3,7 @@ from .admin import router as admin_router
 from .balance import router as balance_router
 from .order import router as order_router
 from .public import router as public_router
+from .stream import router as stream_router
 
 
 api_router = APIRouter(
@@ -10,6 +11,7 @@ api_router = APIRouter(
 )
 
 api_router.include_router(public_router)
+api_router.include_router(stream_router)
 api_router.include_router(balance_router)
 api_router.include_router(order_router)
 api_router.include_router(admin_router)
@@ -3,8 +3,10 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, Security
 
+from database import engine
+from redis_client import get_redis
 from app.domain.services import InstrumentService, UserService, WalletService
-from app.domain.entities import Deposit, InstrumentCreate, UserCreate, UserResponse, Withdraw
+from app.domain.entities import Deposit, InstrumentCreate, MetricsResponse, UserCreate, UserResponse, Withdraw
 from app.api.exceptions.schemas import SuccessResponse
 from app.dependencies import get_admin_user, get_instrument_service, get_user_service, get_wallet_service
 
@@ -64,3 +66,14 @@ async def withdraw(
 ) -> SuccessResponse:
     await wallet_service.withdraw(withdraw=withdraw)
     return SuccessResponse()
+
+
+@router.get('/metrics')
+async def get_metrics(
+    admin_user: Annotated[UserResponse, Security(get_admin_user)],
+) -> MetricsResponse:
+    # Метрики пулов текущего процесса (у каждого воркера gunicorn свои)
+    return MetricsResponse(
+        database=engine.sync_engine.pool.stats(),
+        redis=get_redis().connection_pool.stats(),
+    )
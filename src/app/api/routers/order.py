@@ -1,10 +1,11 @@
 import uuid
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Body, Depends, Query, Response
 
 from app.domain.services import OrderService, WalletService
 from app.domain.entities import (
+    BatchOrderResponse,
     LimitOrderCreate,
     LimitOrderResponse,
     MarketOrderCreate,
@@ -12,7 +13,8 @@ from app.domain.entities import (
     SuccessOrderResponse,
     UserResponse,
 )
-from app.dependencies import get_current_user, get_order_service
+from app.domain.matching.dispatcher import OrderDispatcher
+from app.dependencies import get_current_user, get_order_dispatcher, get_order_service
 from app.api.exceptions.schemas import SuccessResponse
 
 
@@ -26,18 +28,34 @@ router = APIRouter(
 async def create_order(
     order: LimitOrderCreate | MarketOrderCreate,
     current_user: Annotated[UserResponse, Depends(get_current_user)],
-    order_service: Annotated[OrderService, Depends(get_order_service)],
+    order_dispatcher: Annotated[OrderDispatcher, Depends(get_order_dispatcher)],
 ) -> SuccessOrderResponse:
-    new_order = await order_service.create_order(user_id=current_user.id, order=order)
+    new_order = await order_dispatcher.create_order(user_id=current_user.id, order=order)
     return new_order
 
 
+@router.post('/batch')
+async def create_orders(
+    orders: Annotated[list[LimitOrderCreate | MarketOrderCreate], Body(min_length=1, max_length=100)],
+    current_user: Annotated[UserResponse, Depends(get_current_user)],
+    order_dispatcher: Annotated[OrderDispatcher, Depends(get_order_dispatcher)],
+) -> list[BatchOrderResponse]:
+    results = await order_dispatcher.create_orders(user_id=current_user.id, orders=orders)
+    return results
+
+
 @router.get('')
 async def list_orders(
     current_user: Annotated[UserResponse, Depends(get_current_user)],
     order_service: Annotated[OrderService, Depends(get_order_service)],
+    response: Response,
+    after: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=1000)] = None,
 ) -> list[LimitOrderResponse | MarketOrderResponse]:
-    user_orders = await order_service.list_orders(user_id=current_user.id)
+    user_orders, next_cursor = await order_service.list_orders(user_id=current_user.id, after=after, limit=limit)
+    # Курсор следующей страницы передается в after, тело ответа остается списком
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
     return user_orders
 
 
@@ -55,7 +73,7 @@ async def get_order(
 async def cancel_order(
     order_id: uuid.UUID,
     current_user: Annotated[UserResponse, Depends(get_current_user)],
-    order_service: Annotated[OrderService, Depends(get_order_service)],
+    order_dispatcher: Annotated[OrderDispatcher, Depends(get_order_dispatcher)],
 ) -> SuccessResponse:
-    await order_service.cancel_order(order_id=order_id, user_id=current_user.id)
+    await order_dispatcher.cancel_order(order_id=order_id, user_id=current_user.id)
     return SuccessResponse()
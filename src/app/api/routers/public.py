@@ -1,22 +1,27 @@
 import uuid
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
 
 from app.domain.services import (
+    CandleService,
     InstrumentService,
     OrderService,
     TransactionService,
     UserService,
 )
 from app.domain.entities import (
+    CandleResponse,
     InstrumentResponse,
     OrderBookResponse,
-    TransactionResponse,
+    TransactionHistoryResponse,
     UserCreate,
     UserResponse,
 )
+from app.domain.enums import CandleInterval, ExportFormat
 from app.dependencies import (
+    get_candle_service,
     get_instrument_service,
     get_order_service,
     get_transaction_service,
@@ -47,14 +52,20 @@ async def list_instruments(
     return instruments
 
 
-@router.get('/orderbook/{ticker}')
+@router.get('/orderbook/{ticker}', response_model=OrderBookResponse)
 async def get_orderbook(
     ticker: str,
     order_service: Annotated[OrderService, Depends(get_order_service)],
     limit: int = 10,
-) -> OrderBookResponse:
-    orderbook = await order_service.get_orderbook(ticker=ticker, limit=limit)
-    return orderbook
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    snapshot = await order_service.get_orderbook_snapshot(ticker=ticker, limit=limit)
+    headers = {'ETag': snapshot.etag}
+
+    if if_none_match and snapshot.etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=snapshot.body, media_type='application/json', headers=headers)
 
 
 @router.get('/transactions/{ticker}')
@@ -62,6 +73,30 @@ async def get_transaction_history(
     ticker: str,
     transaction_service: Annotated[TransactionService, Depends(get_transaction_service)],
     limit: int = 10,
-) -> list[TransactionResponse]:
-    transactions = await transaction_service.get_transactions(ticker=ticker, limit=limit)
+    before_id: int | None = None,
+) -> list[TransactionHistoryResponse]:
+    transactions = await transaction_service.get_transactions(ticker=ticker, limit=limit, before_id=before_id)
     return transactions
+
+
+@router.get('/transactions/{ticker}/export')
+async def export_transaction_history(
+    ticker: str,
+    transaction_service: Annotated[TransactionService, Depends(get_transaction_service)],
+    export_format: Annotated[ExportFormat, Query(alias='format')] = ExportFormat.NDJSON,
+) -> StreamingResponse:
+    content = await transaction_service.export_transactions(ticker=ticker, export_format=export_format)
+    media_type = 'text/csv' if export_format == ExportFormat.CSV else 'application/x-ndjson'
+    headers = {'Content-Disposition': f'attachment; filename="{ticker}_transactions.{export_format.value}"'}
+    return StreamingResponse(content, media_type=media_type, headers=headers)
+
+
+@router.get('/candles/{ticker}')
+async def get_candles(
+    ticker: str,
+    candle_service: Annotated[CandleService, Depends(get_candle_service)],
+    interval: CandleInterval = CandleInterval.MINUTE,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+) -> list[CandleResponse]:
+    candles = await candle_service.get_candles(ticker=ticker, interval=interval, limit=limit)
+    return candles
@@ -0,0 +1,74 @@
+import asyncio
+import json
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+
+from app.data.repositories import OrderBookBroadcaster, RESYNC_EVENT
+from app.domain.services import OrderService
+from app.dependencies import get_order_service, get_orderbook_broadcaster
+
+
+router = APIRouter(
+    prefix='/public',
+    tags=['Public']
+)
+
+
+async def send_snapshot(websocket: WebSocket, order_service: OrderService, ticker: str, limit: int) -> int:
+    orderbook, version = await order_service.get_versioned_orderbook(ticker=ticker, limit=limit)
+    await websocket.send_text(json.dumps({
+        'type': 'snapshot',
+        'ticker': ticker,
+        'version': version,
+        **orderbook.model_dump(mode='json'),
+    }))
+    return version
+
+
+@router.websocket('/ws/{ticker}')
+async def stream_orderbook(
+    websocket: WebSocket,
+    ticker: str,
+    order_service: Annotated[OrderService, Depends(get_order_service)],
+    broadcaster: Annotated[OrderBookBroadcaster, Depends(get_orderbook_broadcaster)],
+    limit: int = 10,
+):
+    await websocket.accept()
+
+    async def forward_events(events: asyncio.Queue):
+        # Подписка оформляется до снимка, поэтому изменения не теряются,
+        # а уже вошедшие в снимок отбрасываются по версии
+        version = await send_snapshot(websocket, order_service, ticker, limit)
+        while True:
+            event = await events.get()
+            if event.type == RESYNC_EVENT:
+                version = await send_snapshot(websocket, order_service, ticker, limit)
+            elif event.type == 'levels' and event.version <= version:
+                continue
+            else:
+                await websocket.send_text(event.raw)
+
+    async def wait_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    async with broadcaster.subscribe(ticker) as events:
+        tasks = [
+            asyncio.create_task(forward_events(events)),
+            asyncio.create_task(wait_disconnect()),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    for task in done:
+        exc = task.exception()
+        if exc is not None and not isinstance(exc, WebSocketDisconnect):
+            raise exc
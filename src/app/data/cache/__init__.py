@@ -0,0 +1,3 @@
+from .api_key import ApiKeyCache
+from .instrument import CachedInstrument, InstrumentCache
+from .orderbook import OrderBookSnapshot, OrderBookSnapshotCache
@@ -0,0 +1,67 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+
+class ApiKeyCache:
+    """Результаты аутентификации по api_key в памяти процесса: LRU с ограничением по
+    размеру и времени жизни записи. Записи пользователя можно сбросить по его id.
+
+    Любой сброс увеличивает поколение кэша. Результат, прочитанный из базы до сброса,
+    кладется с поколением на момент чтения и отбрасывается, чтобы не вернуть удаленного пользователя
+    """
+
+    NAME = 'api_keys'
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[uuid.UUID, Any, float]] = OrderedDict()
+        self._keys_by_user: dict[uuid.UUID, set[str]] = {}
+        self.generation = 0
+
+    def get(self, api_key: str) -> Any | None:
+        entry = self._entries.get(api_key)
+        if entry is None:
+            return None
+
+        user_id, value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._remove(api_key)
+            return None
+
+        self._entries.move_to_end(api_key)
+        return value
+
+    def put(self, api_key: str, user_id: uuid.UUID, value: Any, generation: int | None = None):
+        if generation is not None and generation != self.generation:
+            return
+
+        self._remove(api_key)
+        self._entries[api_key] = (user_id, value, time.monotonic() + self.ttl)
+        self._keys_by_user.setdefault(user_id, set()).add(api_key)
+
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: uuid.UUID):
+        self.generation += 1
+        for api_key in self._keys_by_user.pop(user_id, set()):
+            self._entries.pop(api_key, None)
+
+    def invalidate(self):
+        self.generation += 1
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+    def _remove(self, api_key: str):
+        entry = self._entries.pop(api_key, None)
+        if entry is None:
+            return
+
+        keys = self._keys_by_user.get(entry[0])
+        if keys is not None:
+            keys.discard(api_key)
+            if not keys:
+                del self._keys_by_user[entry[0]]
@@ -0,0 +1,45 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class CachedInstrument:
+    id: int
+    ticker: str
+    name: str
+
+
+class InstrumentCache:
+    """Справочник инструментов в памяти процесса: тикер -> инструмент и id -> инструмент.
+
+    Заполняется целиком одним запросом и сбрасывается при изменении инструментов
+    """
+
+    NAME = 'instruments'
+
+    def __init__(self):
+        self._by_ticker: dict[str, CachedInstrument] = {}
+        self._by_id: dict[int, CachedInstrument] = {}
+        self.loaded = False
+
+    def load(self, instruments: list[CachedInstrument]):
+        self._by_ticker = {instrument.ticker: instrument for instrument in instruments}
+        self._by_id = {instrument.id: instrument for instrument in instruments}
+        self.loaded = True
+
+    def add(self, instrument: CachedInstrument):
+        self._by_ticker[instrument.ticker] = instrument
+        self._by_id[instrument.id] = instrument
+
+    def get_by_ticker(self, ticker: str) -> CachedInstrument | None:
+        return self._by_ticker.get(ticker)
+
+    def get_by_id(self, instrument_id: int) -> CachedInstrument | None:
+        return self._by_id.get(instrument_id)
+
+    def tickers(self) -> list[str]:
+        return list(self._by_ticker)
+
+    def invalidate(self):
+        self._by_ticker = {}
+        self._by_id = {}
+        self.loaded = False
@@ -0,0 +1,60 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class OrderBookSnapshot:
+    ticker: str
+    limit: int
+    # Метка пересборки стаканов: после потери данных Redis версии начинаются заново
+    epoch: int
+    version: int
+    body: bytes
+    checked_at: float
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.ticker}:{self.limit}:{self.epoch}:{self.version}"'
+
+
+class OrderBookSnapshotCache:
+    """Сериализованные снимки стакана по (тикер, глубина) в памяти процесса.
+
+    В течение ttl секунд после последней проверки снимок отдается без обращения
+    к Redis, затем сверяются метка пересборки и версия стакана, и снимок
+    пересобирается только если одна из них изменилась.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._snapshots: OrderedDict[tuple[str, int], OrderBookSnapshot] = OrderedDict()
+
+    def get(self, ticker: str, limit: int) -> OrderBookSnapshot | None:
+        snapshot = self._snapshots.get((ticker, limit))
+        if snapshot is not None:
+            self._snapshots.move_to_end((ticker, limit))
+        return snapshot
+
+    def is_fresh(self, snapshot: OrderBookSnapshot) -> bool:
+        return time.monotonic() - snapshot.checked_at < self.ttl
+
+    def touch(self, snapshot: OrderBookSnapshot):
+        snapshot.checked_at = time.monotonic()
+
+    def put(self, ticker: str, limit: int, epoch: int, version: int, body: bytes) -> OrderBookSnapshot:
+        snapshot = OrderBookSnapshot(
+            ticker=ticker,
+            limit=limit,
+            epoch=epoch,
+            version=version,
+            body=body,
+            checked_at=time.monotonic(),
+        )
+        self._snapshots[(ticker, limit)] = snapshot
+        self._snapshots.move_to_end((ticker, limit))
+
+        while len(self._snapshots) > self.max_size:
+            self._snapshots.popitem(last=False)
+        return snapshot
@@ -1,6 +1,8 @@
 from .balance import Balance
+from .candle import Candle
 from .instrument import Instrument
 from .order import Order
+from .trade_outbox import TradeOutbox
 from .transaction import Transaction
 from .user import User
 from .wallet import Wallet
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import ForeignKey, Integer, String, UniqueConstraint
 from sqlalchemy.orm import mapped_column, relationship, Mapped
 
 from database import Base
@@ -7,6 +7,9 @@ from app.data.types import CreatedAt, ID
 
 class Balance(Base):
     __tablename__ = 'balances'
+    __table_args__ = (
+        UniqueConstraint('wallet_id', 'instrument_id', name='uq_balances_wallet_id_instrument_id'),
+    )
 
     id: Mapped[ID]
     wallet_id: Mapped[int] = mapped_column(ForeignKey('wallets.id', ondelete='CASCADE'), nullable=False)
@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, ForeignKey, String, UniqueConstraint
+from sqlalchemy.orm import mapped_column, Mapped
+
+from database import Base
+from app.data.types import ID
+from app.domain.enums import CandleInterval
+
+
+class Candle(Base):
+    __tablename__ = 'candles'
+    __table_args__ = (
+        UniqueConstraint('instrument_id', 'interval', 'start', name='uq_candles_instrument_id_interval_start'),
+    )
+
+    id: Mapped[ID]
+    instrument_id: Mapped[int] = mapped_column(ForeignKey('instruments.id', ondelete='CASCADE'), nullable=False)
+    interval: Mapped[CandleInterval] = mapped_column(String(2))
+    start: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    open: Mapped[int]
+    high: Mapped[int]
+    low: Mapped[int]
+    close: Mapped[int]
+    volume: Mapped[int] = mapped_column(BigInteger)
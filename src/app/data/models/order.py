@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import text, ForeignKey, Integer, String
+from sqlalchemy import text, ForeignKey, Index, Integer, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import mapped_column, relationship, Mapped
 
@@ -11,6 +11,15 @@ from app.domain.enums import OrderDirection, OrderStatus, OrderType
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Активные заявки пользователя, новые первыми
+        Index(
+            'ix_orders_user_id_timestamp_open',
+            'user_id',
+            'timestamp',
+            postgresql_where=text(f"status IN ('{OrderStatus.NEW.value}', '{OrderStatus.PARTIALLY_EXECUTED.value}')"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, server_default=text('gen_random_uuid()'))
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import mapped_column, Mapped
+
+from database import Base
+
+
+class TradeOutbox(Base):
+    """Сделки исполнения, ожидающие записи в transactions и свечи процессом trade_writer.
+    Пишутся в транзакции заявки, поэтому не теряются при сбое после коммита"""
+
+    __tablename__ = 'trade_outbox'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    transactions: Mapped[list[dict]] = mapped_column(JSONB)
+    # Сколько раз запись не удалось перенести, после TradeOutboxRepository.MAX_ATTEMPTS она пропускается
+    attempts: Mapped[int] = mapped_column(server_default='0')
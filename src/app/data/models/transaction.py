@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import ForeignKey, Index, String
 from sqlalchemy.orm import mapped_column, relationship, Mapped
 
 from database import Base
@@ -7,13 +7,19 @@ from app.data.types import CreatedAt, ID
 
 class Transaction(Base):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        Index('ix_transactions_instrument_id_timestamp', 'instrument_id', 'timestamp'),
+        # Секции по месяцам создает и архивирует scripts/partition_transactions.py
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
-    id: Mapped[ID]
+    # Ключ секционирования обязан входить в первичный ключ
+    id: Mapped[ID] = mapped_column(autoincrement=True)
     instrument_id: Mapped[str] = mapped_column(ForeignKey('instruments.id', ondelete='CASCADE'), nullable=False)
     wallet_id: Mapped[int] = mapped_column(ForeignKey('wallets.id', ondelete='CASCADE'), nullable=False)
     amount: Mapped[int]
     price: Mapped[int]
-    timestamp: Mapped[CreatedAt]
+    timestamp: Mapped[CreatedAt] = mapped_column(primary_key=True)
 
     instrument: Mapped['Instrument'] = relationship(back_populates='transactions')
     wallet: Mapped['Wallet'] = relationship(back_populates='transactions')
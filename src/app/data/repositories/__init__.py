@@ -1,7 +1,12 @@
 from .balance import BalanceRepository
+from .cache_invalidation import CacheInvalidationRepository
+from .candle import CandleRepository
 from .instrument import InstrumentRepository
+from .matcher_queue import MatcherQueueRepository
 from .order import OrderRepository
+from .orderbook_events import OrderBookBroadcaster, OrderBookEvent, RESYNC_EVENT
 from .redis_orderbook import OrderBookRepository
+from .trade_outbox import TradeOutboxRepository
 from .transaction import TransactionRepository
 from .user import UserRepository
 from .wallet import WalletRepository
@@ -1,60 +1,154 @@
 from fastapi import HTTPException
 
-from sqlalchemy import select, update
+from sqlalchemy import column, func, select, tuple_, update, values, Integer
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.data.repositories.base import SQLAlchemyRepository
 from app.data.models import Balance
 
 
 class BalanceRepository(SQLAlchemyRepository[Balance]):
+    # Первый ключ рекомендательной блокировки кошелька, второй - id кошелька
+    WALLET_LOCK = 1
+
     def __init__(self, session: AsyncSession):
         super().__init__(session, Balance)
 
     async def get_user_balance_of_instrument(self, wallet_id: int, instrument_id: int) -> Balance | None:
+        """Чтение без блокировки: изменения балансов делаются условными UPDATE"""
         query = (
             select(Balance)
             .where(
                 Balance.wallet_id == wallet_id,
                 Balance.instrument_id == instrument_id
             )
-            .with_for_update()
         )
         result = await self.session.scalar(query)
         return result
 
-    async def update_user_balance_of_instrument(self, balance_id: int, amount: int) -> None:
+    async def lock_wallet(self, wallet_id: int) -> None:
+        """Блокировка кошелька до конца транзакции. Ее берут до любых блокировок балансов все
+        операции, уменьшающие свободный остаток, поэтому они идут по кошельку друг за другом"""
+        await self.session.execute(select(func.pg_advisory_xact_lock(self.WALLET_LOCK, wallet_id)))
+
+    async def get_balances(self, pairs: list[tuple[int, int]]) -> dict[tuple[int, int], Balance]:
+        """Балансы (кошелек, инструмент) одним запросом без блокировки, с актуальными значениями"""
+        if not pairs:
+            return {}
+
+        query = (
+            select(Balance)
+            .where(tuple_(Balance.wallet_id, Balance.instrument_id).in_(pairs))
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.scalars(query)
+        return {(balance.wallet_id, balance.instrument_id): balance for balance in result}
+
+    async def lock_balances(self, pairs: list[tuple[int, int]]) -> dict[tuple[int, int], Balance]:
+        """Блокирует балансы (кошелек, инструмент) одним запросом и возвращает их по ключу.
+
+        Строки блокируются в порядке id, поэтому встречные транзакции не взаимоблокируются
+        """
+        if not pairs:
+            return {}
+
+        query = (
+            select(Balance)
+            .where(tuple_(Balance.wallet_id, Balance.instrument_id).in_(pairs))
+            .order_by(Balance.id)
+            .with_for_update()
+        )
+        result = await self.session.scalars(query)
+        return {(balance.wallet_id, balance.instrument_id): balance for balance in result}
+
+    async def apply_deltas(self, deltas: dict[tuple[int, int], tuple[int, int]]) -> None:
+        """Применяет изменения (amount, reserved) к балансам (кошелек, инструмент) одним UPDATE.
+
+        Недостающие балансы создаются, если по ним только зачисление
+        """
+        if not deltas:
+            return
+
+        changes = values(
+            column('wallet_id', Integer),
+            column('instrument_id', Integer),
+            column('amount', Integer),
+            column('reserved', Integer),
+            name='changes',
+        ).data([
+            (wallet_id, instrument_id, amount, reserved)
+            for (wallet_id, instrument_id), (amount, reserved) in deltas.items()
+        ])
         stmt = (
             update(Balance)
-            .where(Balance.id == balance_id)
-            .values(amount=Balance.amount + amount)
+            .where(
+                Balance.wallet_id == changes.c.wallet_id,
+                Balance.instrument_id == changes.c.instrument_id
+            )
+            .values(
+                amount=Balance.amount + changes.c.amount,
+                reserved=Balance.reserved + changes.c.reserved,
+            )
+            .returning(Balance.id, Balance.wallet_id, Balance.instrument_id, Balance.amount, Balance.reserved)
+            .execution_options(synchronize_session=False)
         )
-        await self.session.execute(stmt)
-        await self.session.flush()
+        result = await self.session.execute(stmt)
+
+        updated = set()
+        for balance_id, wallet_id, instrument_id, amount, reserved in result:
+            if reserved < 0:
+                raise HTTPException(status_code=400, detail="Insufficient reserved funds")
+            if amount < reserved:
+                raise HTTPException(status_code=400, detail="Insufficient available funds")
 
-    async def reserve(self, wallet_id: int, instrument_id: int, amount: int):
-        """Резервируем средства на балансе"""
-        balance = await self.get_user_balance_of_instrument(wallet_id, instrument_id)
-        if not balance:
-            raise HTTPException(status_code=400, detail="Balance not found")
-        
-        if balance.amount < amount:
-            raise HTTPException(status_code=400, detail="Insufficient funds")
-        
-        balance.reserved += amount
+            self._refresh_loaded(balance_id, amount, reserved)
+            updated.add((wallet_id, instrument_id))
+
+        for (wallet_id, instrument_id), (amount, reserved) in deltas.items():
+            if (wallet_id, instrument_id) in updated:
+                continue
+            if amount < 0 or reserved != 0:
+                raise HTTPException(status_code=400, detail="Balance not found")
+
+            self.session.add(Balance(
+                wallet_id=wallet_id,
+                instrument_id=instrument_id,
+                amount=amount,
+                reserved=0
+            ))
         await self.session.flush()
 
     async def release(self, wallet_id: int, instrument_id: int, amount: int):
         """Освобождаем зарезервированные средства"""
-        balance = await self.get_user_balance_of_instrument(wallet_id, instrument_id)
-        if not balance:
-            raise HTTPException(status_code=400, detail="Balance not found")
-        
-        if balance.reserved < amount:
-            raise HTTPException(status_code=400, detail="Insufficient reserved funds")
-        
-        balance.reserved -= amount
-        await self.session.flush()
+        stmt = self._update_balance(
+            Balance.wallet_id == wallet_id,
+            Balance.instrument_id == instrument_id,
+            Balance.reserved >= amount,
+            reserved=Balance.reserved - amount,
+        )
+        if not await self._execute_update(stmt):
+            await self._raise_not_updated(wallet_id, instrument_id, "Insufficient reserved funds")
+
+    async def deposit(self, wallet_id: int, instrument_id: int, amount: int):
+        """Зачисление одним запросом, недостающий баланс создается"""
+        stmt = insert(Balance).values(wallet_id=wallet_id, instrument_id=instrument_id, amount=amount, reserved=0)
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_balances_wallet_id_instrument_id',
+            set_={'amount': Balance.amount + amount},
+        )
+        await self.session.execute(stmt)
+
+    async def withdraw(self, wallet_id: int, instrument_id: int, amount: int) -> bool:
+        """Списание из свободного остатка. False - баланса нет или остатка не хватает"""
+        stmt = self._update_balance(
+            Balance.wallet_id == wallet_id,
+            Balance.instrument_id == instrument_id,
+            Balance.amount - Balance.reserved >= amount,
+            amount=Balance.amount - amount,
+        )
+        return bool(await self._execute_update(stmt))
 
     async def transfer(
         self, 
@@ -63,27 +157,49 @@ class BalanceRepository(SQLAlchemyRepository[Balance]):
         instrument_id: int, 
         amount: int
     ):
-        from_balance = await self.get_user_balance_of_instrument(from_wallet_id, instrument_id)
-        to_balance = await self.get_user_balance_of_instrument(to_wallet_id, instrument_id)
-        
-        if not from_balance:
-            raise HTTPException(status_code=400, detail="Sender balance not found")
-            
-        if not to_balance:
-            to_balance = Balance(
-                wallet_id=to_wallet_id,
-                instrument_id=instrument_id,
-                amount=0,
-                reserved=0
-            )
-            self.session.add(to_balance)
-            await self.session.flush()
-        
-        # Проверяем доступный баланс (общий - зарезервированный)
-        available = from_balance.amount - from_balance.reserved
-        if available < amount:
-            raise HTTPException(status_code=400, detail="Insufficient available funds")
-        
-        from_balance.amount -= amount
-        to_balance.amount += amount
-        await self.session.flush()
+        """Перевод между кошельками. Оба баланса блокируются заранее в порядке id, как при
+        расчетах по сделкам. Кошелек отправителя блокирует вызывающий через lock_wallet"""
+        await self.lock_balances([(from_wallet_id, instrument_id), (to_wallet_id, instrument_id)])
+        if not await self.withdraw(from_wallet_id, instrument_id, amount):
+            await self._raise_not_updated(from_wallet_id, instrument_id, "Insufficient available funds", "Sender balance not found")
+
+        await self.deposit(to_wallet_id, instrument_id, amount)
+
+    @staticmethod
+    def _update_balance(*conditions, **changes):
+        return (
+            update(Balance)
+            .where(*conditions)
+            .values(**changes)
+            .returning(Balance.id, Balance.amount, Balance.reserved)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _execute_update(self, stmt) -> list[int]:
+        """Выполняет UPDATE балансов и переносит новые значения в загруженные объекты.
+        Возвращает id измененных балансов"""
+        result = await self.session.execute(stmt)
+        updated = []
+        for balance_id, amount, reserved in result:
+            self._refresh_loaded(balance_id, amount, reserved)
+            updated.append(balance_id)
+        return updated
+
+    def _refresh_loaded(self, balance_id: int, amount: int, reserved: int):
+        # Загруженные в сессию объекты получают новые значения без повторного SELECT
+        balance = self.session.identity_map.get(self.session.identity_key(Balance, balance_id))
+        if balance is not None:
+            set_committed_value(balance, 'amount', amount)
+            set_committed_value(balance, 'reserved', reserved)
+
+    async def _raise_not_updated(
+        self,
+        wallet_id: int,
+        instrument_id: int,
+        detail: str,
+        not_found_detail: str = "Balance not found",
+    ):
+        # Причину отказа условного UPDATE выясняем отдельным чтением, только на этом редком пути
+        if not await self.get_user_balance_of_instrument(wallet_id, instrument_id):
+            raise HTTPException(status_code=400, detail=not_found_detail)
+        raise HTTPException(status_code=400, detail=detail)
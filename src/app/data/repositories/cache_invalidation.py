@@ -0,0 +1,51 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+
+from redis.asyncio import Redis
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheInvalidationRepository:
+    """Оповещение всех процессов о том, что локальный кэш устарел, через Redis Pub/Sub"""
+
+    CHANNEL = 'cache:invalidate'
+    RESUBSCRIBE_DELAY = 1
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def publish(self, name: str, key: str = ''):
+        """Сбросить кэш name целиком или только запись key"""
+        await self.redis.publish(self.CHANNEL, f'{name}:{key}' if key else name)
+
+    async def listen(self) -> AsyncIterator[tuple[str, str] | None]:
+        """Пары (кэш, ключ) для сброса, пустой ключ - сбросить кэш целиком. None означает,
+        что подписка прерывалась и сообщения могли потеряться - сбрасывать нужно все"""
+        resubscribed = False
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                if resubscribed:
+                    # Кэши могли заполниться устаревшими данными, пока подписки не было
+                    logger.info('Resubscribed to cache invalidations')
+                    resubscribed = False
+                    yield None
+
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        name, _, key = message['data'].partition(':')
+                        yield name, key
+            except Exception:
+                logger.exception('Cache invalidation subscription failed, resubscribing')
+                resubscribed = True
+                yield None
+                await asyncio.sleep(self.RESUBSCRIBE_DELAY)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    logger.warning('Failed to close cache invalidation subscription', exc_info=True)
@@ -0,0 +1,87 @@
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.data.repositories.base import SQLAlchemyRepository
+from app.data.models import Candle
+from app.domain.enums import CandleInterval
+
+
+class CandleRepository(SQLAlchemyRepository[Candle]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(session, Candle)
+
+    async def add_trades(self, instrument_id: int, trades: list[tuple[int, int]], timestamp: datetime) -> None:
+        """Дописывает сделки (цена, количество), исполненные в момент timestamp, в свечи всех
+        интервалов одним upsert'ом. Сделки идут в порядке исполнения: первая открывает свечу, последняя закрывает"""
+        if not trades:
+            return
+
+        prices = [price for price, _ in trades]
+        volume = sum(qty for _, qty in trades)
+        values = [
+            {
+                'instrument_id': instrument_id,
+                'interval': interval.value,
+                'start': interval.truncate(timestamp),
+                'open': prices[0],
+                'high': max(prices),
+                'low': min(prices),
+                'close': prices[-1],
+                'volume': volume,
+            }
+            for interval in CandleInterval
+        ]
+
+        query = insert(Candle).values(values)
+        await self.session.execute(self._merge_candles(query))
+
+    async def add_timed_trades(self, trades: list[tuple[int, int, int, datetime]]) -> None:
+        """То же для сделок (инструмент, цена, количество, время) разных инструментов и моментов,
+        например пачки фоновой записи. Сделки идут в порядке исполнения"""
+        if not trades:
+            return
+
+        candles = {}
+        for instrument_id, price, qty, timestamp in trades:
+            for interval in CandleInterval:
+                key = (instrument_id, interval.value, interval.truncate(timestamp))
+                candle = candles.get(key)
+                if candle is None:
+                    candles[key] = {'open': price, 'high': price, 'low': price, 'close': price, 'volume': qty}
+                else:
+                    candle['high'] = max(candle['high'], price)
+                    candle['low'] = min(candle['low'], price)
+                    candle['close'] = price
+                    candle['volume'] += qty
+
+        query = insert(Candle).values([
+            {'instrument_id': instrument_id, 'interval': interval, 'start': start, **candle}
+            for (instrument_id, interval, start), candle in candles.items()
+        ])
+        await self.session.execute(self._merge_candles(query))
+
+    async def get_candles(self, instrument_id: int, interval: CandleInterval, limit: int) -> list[Candle]:
+        """Последние limit свечей в порядке возрастания времени"""
+        query = (
+            select(Candle)
+            .where(Candle.instrument_id == instrument_id, Candle.interval == interval)
+            .order_by(Candle.start.desc())
+            .limit(limit)
+        )
+        result = await self.session.scalars(query)
+        return result.all()[::-1]
+
+    @staticmethod
+    def _merge_candles(query):
+        """Существующая свеча сохраняет open, остальное дополняется новыми сделками"""
+        return query.on_conflict_do_update(
+            constraint='uq_candles_instrument_id_interval_start',
+            set_={
+                'high': func.greatest(Candle.high, query.excluded.high),
+                'low': func.least(Candle.low, query.excluded.low),
+                'close': query.excluded.close,
+                'volume': Candle.volume + query.excluded.volume,
+            },
+        )
@@ -2,14 +2,50 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.data.repositories.base import SQLAlchemyRepository
+from app.data.cache import CachedInstrument, InstrumentCache
 from app.data.models import Instrument
 
 
 class InstrumentRepository(SQLAlchemyRepository[Instrument]):
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, cache: InstrumentCache | None = None):
         super().__init__(session, Instrument)
+        self.cache = cache if cache is not None else InstrumentCache()
 
     async def get_instrument_by_ticker(self, ticker: str) -> Instrument | None:
         query = select(Instrument).where(Instrument.ticker == ticker)
         result = await self.session.scalar(query)
-        return result
\ No newline at end of file
+        return result
+
+    async def warm_cache(self) -> None:
+        instruments = await self.get_all()
+        self.cache.load([self._to_cached(instrument) for instrument in instruments])
+
+    async def get_cached_by_ticker(self, ticker: str) -> CachedInstrument | None:
+        """Инструмент из кэша процесса. Промах проверяется в базе, т.к. инструмент мог
+        появиться в другом процессе раньше, чем пришло оповещение"""
+        if not self.cache.loaded:
+            await self.warm_cache()
+
+        cached = self.cache.get_by_ticker(ticker)
+        if cached is None:
+            instrument = await self.get_instrument_by_ticker(ticker)
+            if instrument is not None:
+                cached = self._to_cached(instrument)
+                self.cache.add(cached)
+        return cached
+
+    async def get_cached_by_id(self, instrument_id: int) -> CachedInstrument | None:
+        if not self.cache.loaded:
+            await self.warm_cache()
+
+        cached = self.cache.get_by_id(instrument_id)
+        if cached is None:
+            instrument = await self.get_by_id(instrument_id)
+            if instrument is not None:
+                cached = self._to_cached(instrument)
+                self.cache.add(cached)
+        return cached
+
+    @staticmethod
+    def _to_cached(instrument: Instrument) -> CachedInstrument:
+        return CachedInstrument(id=instrument.id, ticker=instrument.ticker, name=instrument.name)
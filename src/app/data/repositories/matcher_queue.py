@@ -0,0 +1,50 @@
+import json
+import time
+import uuid
+from redis.asyncio import Redis
+
+
+class MatcherQueueRepository:
+    """Очередь команд процессу-матчеру и ответов от него через списки Redis"""
+
+    COMMANDS_KEY = 'matcher:commands'
+    REPLY_TTL = 60
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def push_command(self, command: dict, timeout: float) -> str:
+        """Ставит команду в очередь. Позже deadline матчер ее уже не выполняет"""
+        request_id = str(uuid.uuid4())
+        await self.redis.rpush(
+            self.COMMANDS_KEY,
+            json.dumps({**command, 'request_id': request_id, 'deadline': time.time() + timeout})
+        )
+        return request_id
+
+    async def pop_command(self, timeout: float = 1) -> dict | None:
+        result = await self.redis.blpop([self.COMMANDS_KEY], timeout=timeout)
+        if not result:
+            return None
+        return json.loads(result[1])
+
+    async def start_command(self, request_id: str) -> bool:
+        """Матчер занимает команду перед выполнением. False - клиент уже отказался от нее"""
+        return bool(await self.redis.set(f'matcher:state:{request_id}', 'started', nx=True, ex=self.REPLY_TTL))
+
+    async def expire_command(self, request_id: str) -> bool:
+        """Клиент снимает команду, не дождавшись ответа. False - матчер уже начал ее выполнять"""
+        return bool(await self.redis.set(f'matcher:state:{request_id}', 'expired', nx=True, ex=self.REPLY_TTL))
+
+    async def push_reply(self, request_id: str, reply: dict):
+        key = f'matcher:reply:{request_id}'
+        pipe = self.redis.pipeline()
+        pipe.rpush(key, json.dumps(reply))
+        pipe.expire(key, self.REPLY_TTL)
+        await pipe.execute()
+
+    async def wait_reply(self, request_id: str, timeout: float) -> dict | None:
+        result = await self.redis.blpop([f'matcher:reply:{request_id}'], timeout=timeout)
+        if not result:
+            return None
+        return json.loads(result[1])
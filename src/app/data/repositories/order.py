@@ -1,10 +1,11 @@
 import uuid
-from sqlalchemy import and_, or_, select
+from datetime import datetime
+from sqlalchemy import and_, or_, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.data.repositories.base import SQLAlchemyRepository
-from app.data.models import Order
-from app.domain.enums import OrderStatus
+from app.data.models import Instrument, Order
+from app.domain.enums import OrderDirection, OrderStatus, OrderType
 
 
 class OrderRepository(SQLAlchemyRepository[Order]):
@@ -33,14 +34,49 @@ class OrderRepository(SQLAlchemyRepository[Order]):
         self.session.add(order)
         await self.session.flush()
 
-    async def get_user_orders(self, user_id: uuid.UUID) -> list[Order]:
+    async def get_user_orders(
+        self,
+        user_id: uuid.UUID,
+        after: tuple[datetime, uuid.UUID] | None = None,
+        limit: int | None = None,
+    ) -> list[tuple[Order, str]]:
+        """Активные заявки пользователя вместе с тикером, от новых к старым.
+        Курсор after - (timestamp, id) последней заявки предыдущей страницы"""
         query = (
-            select(Order)
+            select(Order, Instrument.ticker)
+            .join(Instrument, Instrument.id == Order.instrument_id)
             .where(
                 Order.user_id == user_id,
                 or_(Order.status == OrderStatus.NEW, Order.status == OrderStatus.PARTIALLY_EXECUTED)
             )
-            .order_by(Order.timestamp.desc())
+            .order_by(Order.timestamp.desc(), Order.id.desc())
         )
-        result = await self.session.scalars(query)
-        return result
+        if after is not None:
+            query = query.where(tuple_(Order.timestamp, Order.id) < tuple_(*after))
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await self.session.execute(query)
+        return result.tuples().all()
+
+    async def get_book_orders(self) -> list[tuple[str, uuid.UUID, uuid.UUID, OrderDirection, int, int]]:
+        """Активные лимитные заявки всех инструментов в порядке выставления:
+        (тикер, id, пользователь, направление, цена, остаток)"""
+        result = await self.session.execute(
+            select(
+                Instrument.ticker,
+                Order.id,
+                Order.user_id,
+                Order.direction,
+                Order.price,
+                Order.qty - Order.filled,
+            )
+            .join(Instrument, Instrument.id == Order.instrument_id)
+            .where(
+                Order.order_type == OrderType.LIMIT,
+                or_(Order.status == OrderStatus.NEW, Order.status == OrderStatus.PARTIALLY_EXECUTED),
+                Order.qty > Order.filled,
+            )
+            .order_by(Order.timestamp, Order.id)
+        )
+        return result.tuples().all()
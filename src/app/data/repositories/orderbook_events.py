@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+from redis.asyncio import Redis
+
+from app.data.repositories.redis_orderbook import events_channel
+
+
+RESYNC_EVENT = 'resync'
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class OrderBookEvent:
+    type: str
+    version: int | None
+    raw: str
+
+
+class OrderBookBroadcaster:
+    """Одна подписка Redis Pub/Sub на процесс, раздающая события стакана локальным подписчикам"""
+
+    # Пауза перед повторной подпиской после разрыва соединения, в секундах
+    RETRY_DELAY = 1.0
+
+    def __init__(self, redis_factory: Callable[[], Redis], queue_size: int = 1000):
+        self.redis_factory = redis_factory
+        self.queue_size = queue_size
+        self._pubsub = None
+        self._reader: asyncio.Task | None = None
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+
+    @asynccontextmanager
+    async def subscribe(self, ticker: str) -> AsyncIterator[asyncio.Queue]:
+        if self._pubsub is None:
+            self._pubsub = self.redis_factory().pubsub(ignore_subscribe_messages=True)
+
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscribers = self._subscribers.setdefault(ticker, set())
+        if not subscribers:
+            await self._pubsub.subscribe(events_channel(ticker))
+        subscribers.add(queue)
+
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+        try:
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[ticker]
+                try:
+                    await self._pubsub.unsubscribe(events_channel(ticker))
+                except Exception:
+                    # Разорванную подписку восстановит _read, уже без этого канала
+                    logger.warning('Failed to unsubscribe from %s events', ticker, exc_info=True)
+
+    async def _read(self):
+        while self._subscribers:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except Exception:
+                logger.exception('Orderbook events subscription failed, resubscribing')
+                await self._resubscribe()
+                continue
+
+            if message is None or message['type'] != 'message':
+                continue
+
+            try:
+                data = json.loads(message['data'])
+                ticker = data['ticker']
+                event = OrderBookEvent(type=data['type'], version=data.get('version'), raw=message['data'])
+            except (ValueError, KeyError, TypeError):
+                logger.warning('Skipping malformed orderbook event on %s: %r', message['channel'], message['data'])
+                continue
+
+            for queue in self._subscribers.get(ticker, ()):
+                self._put(queue, event)
+
+    async def _resubscribe(self):
+        """Пересоздает подписку на каналы всех текущих инструментов, пока она не удастся"""
+        while self._subscribers:
+            await asyncio.sleep(self.RETRY_DELAY)
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+
+            try:
+                self._pubsub = self.redis_factory().pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(*(events_channel(ticker) for ticker in self._subscribers))
+            except Exception:
+                logger.exception('Failed to resubscribe to orderbook events')
+                continue
+
+            # События за время разрыва потеряны: подписчики заново берут снимок
+            for subscribers in self._subscribers.values():
+                for queue in subscribers:
+                    self._put(queue, OrderBookEvent(type=RESYNC_EVENT, version=None, raw=''))
+            logger.info('Resubscribed to orderbook events of %d tickers', len(self._subscribers))
+            return
+
+    def _put(self, queue: asyncio.Queue, event: OrderBookEvent):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный подписчик пропустил события: сбрасываем очередь и просим заново взять снимок
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(OrderBookEvent(type=RESYNC_EVENT, version=None, raw=''))
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        self._pubsub = None
+        self._reader = None
+        self._subscribers.clear()
@@ -1,3 +1,4 @@
+import json
 import uuid
 import time
 from redis.asyncio import Redis
@@ -6,9 +7,401 @@ from config import settings
 from app.domain.enums import OrderDirection, OrderStatus
 
 
+# Член ZSET стакана имеет вид '<номер в очереди>:<id заявки>', score - цена.
+# Заявки с одинаковым score Redis упорядочивает по члену, поэтому номер дополняется
+# нулями, а у покупок инвертируется: ZRANGE по продажам и ZREVRANGE по покупкам
+# сразу отдают заявки в порядке исполнения (цена, затем время поступления)
+SEQUENCE_WIDTH = 15
+SEQUENCE_LIMIT = 10 ** SEQUENCE_WIDTH
+
+# Номер раскладки стаканов в Redis. Стаканы в другой раскладке (или пустой Redis без
+# этой отметки) заново собираются из Postgres скриптом scripts/rebuild_orderbook.py
+ORDERBOOK_LAYOUT = 1
+LAYOUT_KEY = 'orderbook:layout'
+# Метка последней пересборки стаканов (время в наносекундах). По ней журнал матчинга
+# понимает, что записан до пересборки и стаканы надо брать из Redis
+REBUILT_KEY = 'orderbook:rebuilt'
+
+# Рядом с каждой стороной стакана поддерживаются агрегаты уровней:
+# '<ключ стороны>:depth' (HASH цена -> оставшийся объем) и
+# '<ключ стороны>:levels' (ZSET цен), чтобы отдавать L2 без обхода заявок.
+# Любое изменение агрегатов увеличивает версию стакана, а в конце вызова все
+# изменения уровней публикуются одним сообщением в канал событий инструмента.
+#
+# Все ключи приходят в KEYS, кроме хешей встречных заявок: их id становятся известны
+# только при обходе стакана, поэтому скрипт строит их из префикса инструмента. Все ключи
+# инструмента имеют общий hash tag и лежат в одном слоте Redis Cluster.
+# Общий порядок аргументов: KEYS[1] - версия стакана, ARGV[1] - тикер, ARGV[2] - канал событий
+ORDERBOOK_LUA = f"""
+local version_key = KEYS[1]
+local ticker = ARGV[1]
+local events_channel = ARGV[2]
+
+-- Сторона стакана по трем ключам подряд, начиная с KEYS[index]: заявки, объемы уровней, цены уровней
+local function book_side(index, direction)
+    return {{key = KEYS[index], depth = KEYS[index + 1], levels = KEYS[index + 2], direction = direction}}
+end
+
+local function make_member(direction, seq, order_id)
+    if direction == 'BUY' then
+        seq = {SEQUENCE_LIMIT - 1} - seq
+    end
+    return string.format('%0{SEQUENCE_WIDTH}d', seq) .. ':' .. order_id
+end
+
+local function member_order_id(member)
+    return string.match(member, '([^:]+)$')
+end
+
+local depth_changes = {{}}
+local depth_version = 0
+
+local function change_depth(side, price, delta)
+    delta = tonumber(delta)
+    depth_version = redis.call('INCR', version_key)
+
+    local left = redis.call('HINCRBY', side.depth, price, delta)
+    if left <= 0 then
+        redis.call('HDEL', side.depth, price)
+        redis.call('ZREM', side.levels, price)
+        left = 0
+    elseif delta > 0 then
+        redis.call('ZADD', side.levels, price, price)
+    end
+    table.insert(depth_changes, {{side.direction, tonumber(price), left}})
+end
+
+local function publish_depth()
+    if #depth_changes == 0 then
+        return
+    end
+    redis.call('PUBLISH', events_channel, cjson.encode({{
+        type = 'levels',
+        ticker = ticker,
+        version = depth_version,
+        levels = depth_changes,
+    }}))
+end
+
+local function rest_order(side, seq_key, order_key, order_id, price, qty, user_id, status, timestamp)
+    local member = make_member(side.direction, redis.call('INCR', seq_key), order_id)
+    redis.call('ZADD', side.key, price, member)
+    redis.call('HSET', order_key,
+        'ticker', ticker,
+        'direction', side.direction,
+        'price', price,
+        'qty', qty,
+        'filled', '0',
+        'user_id', user_id,
+        'status', status,
+        'timestamp', timestamp,
+        'member', member)
+    change_depth(side, price, qty)
+    return member
+end
+"""
+
+# Ставит заявку в стакан с очередным номером инструмента.
+# KEYS: версия, сторона (3 ключа), счетчик номеров, хеш заявки.
+# ARGV: тикер, канал, направление, id, цена, объем, пользователь, статус, время
+ADD_ORDER_SCRIPT = ORDERBOOK_LUA + """
+local member = rest_order(book_side(2, ARGV[3]), KEYS[5], KEYS[6], ARGV[4], ARGV[5], ARGV[6], ARGV[7], ARGV[8], ARGV[9])
+publish_depth()
+return member
+"""
+
+# Сводит заявку с противоположной стороной стакана за один вызов: обходит
+# заявки в порядке исполнения, уменьшает объемы, удаляет исполненные и кладет
+# остаток лимитной заявки в стакан. Возвращает плоский список исполнений
+# [id, user_id, price, qty, remaining, member, ...]
+# KEYS: версия, встречная сторона (3 ключа), своя сторона (3 ключа), счетчик номеров, хеш заявки.
+# ARGV: тикер, канал, направление, цена, объем, id, пользователь, статус, время, префикс хешей заявок
+MATCH_ORDER_SCRIPT = ORDERBOOK_LUA + """
+local direction = ARGV[3]
+local price = tonumber(ARGV[4])
+local qty = tonumber(ARGV[5])
+local order_id = ARGV[6]
+local order_prefix = ARGV[10]
+
+local opposite = book_side(2, direction == 'BUY' and 'SELL' or 'BUY')
+local own = book_side(5, direction)
+
+local batch = 64
+local offset = 0
+local fills = {}
+
+while qty > 0 do
+    local entries
+    if direction == 'BUY' then
+        entries = redis.call('ZRANGEBYSCORE', opposite.key, '-inf', price > 0 and price or '+inf', 'WITHSCORES', 'LIMIT', offset, batch)
+    else
+        entries = redis.call('ZREVRANGEBYSCORE', opposite.key, '+inf', price > 0 and price or '-inf', 'WITHSCORES', 'LIMIT', offset, batch)
+    end
+    if #entries == 0 then
+        break
+    end
+
+    for i = 1, #entries, 2 do
+        local member = entries[i]
+        local maker_id = member_order_id(member)
+        local maker_key = order_prefix .. maker_id
+        local data = redis.call('HMGET', maker_key, 'qty', 'filled', 'user_id')
+
+        if not data[1] then
+            redis.call('ZREM', opposite.key, member)
+        else
+            local remaining = tonumber(data[1]) - tonumber(data[2])
+            local fill = math.min(remaining, qty)
+            local left = remaining - fill
+
+            if left <= 0 then
+                redis.call('ZREM', opposite.key, member)
+                redis.call('DEL', maker_key)
+            else
+                offset = offset + 1
+                redis.call('HINCRBY', maker_key, 'qty', -fill)
+                redis.call('HSET', maker_key, 'status', 'PARTIALLY_EXECUTED')
+            end
+
+            if fill > 0 then
+                qty = qty - fill
+                change_depth(opposite, entries[i + 1], -fill)
+                table.insert(fills, maker_id)
+                table.insert(fills, data[3])
+                table.insert(fills, tonumber(entries[i + 1]))
+                table.insert(fills, fill)
+                table.insert(fills, left)
+                table.insert(fills, member)
+            end
+        end
+
+        if qty <= 0 then
+            break
+        end
+    end
+end
+
+if qty > 0 and price > 0 and order_id ~= '' then
+    rest_order(own, KEYS[8], KEYS[9], order_id, ARGV[4], qty, ARGV[7], ARGV[8], ARGV[9])
+end
+
+publish_depth()
+return fills
+"""
+
+# Зеркалирует результат матчинга в памяти. Возвращает члены ZSET заявок в порядке хешей
+# ('' для заявок, которых нет в Redis).
+# KEYS: версия, сторона (3 ключа), хеши заявок. ARGV: тикер, канал, направление,
+# затем тройки (id заявки, объем сделки, оставшийся объем) в порядке хешей
+APPLY_FILLS_SCRIPT = ORDERBOOK_LUA + """
+local side = book_side(2, ARGV[3])
+local members = {}
+for i = 5, #KEYS do
+    local order_key = KEYS[i]
+    local arg = 4 + (i - 5) * 3
+    local data = redis.call('HMGET', order_key, 'price', 'member')
+    local price = data[1]
+    if price then
+        change_depth(side, price, -tonumber(ARGV[arg + 1]))
+    end
+    table.insert(members, data[2] or '')
+
+    if tonumber(ARGV[arg + 2]) > 0 then
+        redis.call('HSET', order_key, 'qty', ARGV[arg + 2], 'filled', '0', 'status', 'PARTIALLY_EXECUTED')
+    else
+        redis.call('ZREM', side.key, data[2] or ARGV[arg])
+        redis.call('DEL', order_key)
+    end
+end
+
+publish_depth()
+return members
+"""
+
+# Возвращает заявке объем исполнения при откате транзакции. Снятая заявка создается заново
+# с прежним членом ZSET и поэтому встает на прежнее место в очереди.
+# KEYS: версия, сторона (3 ключа), хеш заявки.
+# ARGV: тикер, канал, направление, член, цена, объем, пользователь, статус, время
+RESTORE_ORDER_SCRIPT = ORDERBOOK_LUA + """
+local side = book_side(2, ARGV[3])
+if redis.call('EXISTS', KEYS[5]) == 1 then
+    redis.call('HINCRBY', KEYS[5], 'qty', ARGV[6])
+else
+    redis.call('ZADD', side.key, ARGV[5], ARGV[4])
+    redis.call('HSET', KEYS[5],
+        'ticker', ticker,
+        'direction', side.direction,
+        'price', ARGV[5],
+        'qty', ARGV[6],
+        'filled', '0',
+        'user_id', ARGV[7],
+        'status', ARGV[8],
+        'timestamp', ARGV[9],
+        'member', ARGV[4])
+end
+
+change_depth(side, ARGV[5], ARGV[6])
+publish_depth()
+"""
+
+# Уменьшает оставшийся объем заявки.
+# KEYS: версия, сторона (3 ключа), хеш заявки. ARGV: тикер, канал, направление, объем
+FILL_ORDER_SCRIPT = ORDERBOOK_LUA + """
+local price = redis.call('HGET', KEYS[5], 'price')
+if not price then
+    return 0
+end
+
+redis.call('HINCRBY', KEYS[5], 'qty', -tonumber(ARGV[4]))
+change_depth(book_side(2, ARGV[3]), price, -tonumber(ARGV[4]))
+publish_depth()
+return 1
+"""
+
+# Снимает заявку со стакана вместе с ее остатком в агрегатах уровней.
+# KEYS: версия, сторона (3 ключа), хеш заявки. ARGV: тикер, канал, направление, id заявки
+REMOVE_ORDER_SCRIPT = ORDERBOOK_LUA + """
+local data = redis.call('HMGET', KEYS[5], 'price', 'qty', 'filled', 'member')
+if not data[1] then
+    return 0
+end
+
+local side = book_side(2, ARGV[3])
+local remaining = tonumber(data[2]) - tonumber(data[3])
+if remaining > 0 then
+    change_depth(side, data[1], -remaining)
+end
+
+redis.call('ZREM', side.key, data[4] or ARGV[4])
+redis.call('DEL', KEYS[5])
+publish_depth()
+return 1
+"""
+
+# Лучшие ARGV[1] уровней обеих сторон и версия стакана:
+# {{цена, объем, ...}, {цена, объем, ...}, версия}
+# KEYS: цены и объемы уровней покупок, цены и объемы уровней продаж, версия
+DEPTH_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local result = {}
+
+for side = 1, 2 do
+    local levels_key = KEYS[side * 2 - 1]
+    local depth_key = KEYS[side * 2]
+    local prices = {}
+    if limit > 0 and side == 1 then
+        prices = redis.call('ZREVRANGE', levels_key, 0, limit - 1)
+    elseif limit > 0 then
+        prices = redis.call('ZRANGE', levels_key, 0, limit - 1)
+    end
+
+    local levels = {}
+    if #prices > 0 then
+        local qtys = redis.call('HMGET', depth_key, unpack(prices))
+        for i, price in ipairs(prices) do
+            table.insert(levels, price)
+            table.insert(levels, qtys[i] or '0')
+        end
+    end
+    result[side] = levels
+end
+
+result[3] = tonumber(redis.call('GET', KEYS[5]) or '0')
+return result
+"""
+
+# Стоимость исполнения ARGV[2] единиц по лучшим уровням стороны с ценами KEYS[1]
+# и объемами KEYS[2] (ARGV[1] - направление этой стороны) или -1, если объема
+# в стакане не хватает. Обходит только агрегаты уровней и останавливается, как только объем набран
+MARKET_COST_SCRIPT = """
+local remaining = tonumber(ARGV[2])
+local batch = 100
+local offset = 0
+local cost = 0
+
+while remaining > 0 do
+    local prices
+    if ARGV[1] == 'BUY' then
+        prices = redis.call('ZREVRANGE', KEYS[1], offset, offset + batch - 1)
+    else
+        prices = redis.call('ZRANGE', KEYS[1], offset, offset + batch - 1)
+    end
+    if #prices == 0 then
+        return -1
+    end
+
+    local qtys = redis.call('HMGET', KEYS[2], unpack(prices))
+    for i, price in ipairs(prices) do
+        local fill_qty = math.min(tonumber(qtys[i] or '0'), remaining)
+        cost = cost + fill_qty * tonumber(price)
+        remaining = remaining - fill_qty
+        if remaining == 0 then
+            break
+        end
+    end
+    offset = offset + batch
+end
+
+return cost
+"""
+
+
+def make_member(direction: OrderDirection, seq: int, order_id: str) -> str:
+    if direction == OrderDirection.BUY:
+        seq = SEQUENCE_LIMIT - 1 - seq
+    return f'{seq:0{SEQUENCE_WIDTH}d}:{order_id}'
+
+
+def member_order_id(member: str) -> str:
+    return member.rsplit(':', 1)[-1]
+
+
+def ticker_key(ticker: str) -> str:
+    """Префикс ключей инструмента. Hash tag {тикер} кладет их в один слот Redis Cluster"""
+    return f'orderbook:{{{ticker}}}'
+
+
+def book_key(ticker: str, direction: OrderDirection) -> str:
+    return f'{ticker_key(ticker)}:{direction.value}'
+
+
+def side_keys(ticker: str, direction: OrderDirection) -> list[str]:
+    """Ключи стороны стакана: заявки, объемы уровней, цены уровней"""
+    key = book_key(ticker, direction)
+    return [key, f'{key}:depth', f'{key}:levels']
+
+
+def order_key(ticker: str, order_id: str) -> str:
+    return f'{ticker_key(ticker)}:order:{order_id}'
+
+
+def seq_key(ticker: str) -> str:
+    return f'{ticker_key(ticker)}:seq'
+
+
+def version_key(ticker: str) -> str:
+    return f'{ticker_key(ticker)}:version'
+
+
+def events_channel(ticker: str) -> str:
+    return f'orderbook:{ticker}:events'
+
+
+def opposite_direction(direction: OrderDirection) -> OrderDirection:
+    return OrderDirection.SELL if direction == OrderDirection.BUY else OrderDirection.BUY
+
+
 class OrderBookRepository:
     def __init__(self, redis: Redis):
         self.redis = redis
+        self._add_order_script = redis.register_script(ADD_ORDER_SCRIPT)
+        self._match_order_script = redis.register_script(MATCH_ORDER_SCRIPT)
+        self._apply_fills_script = redis.register_script(APPLY_FILLS_SCRIPT)
+        self._fill_order_script = redis.register_script(FILL_ORDER_SCRIPT)
+        self._remove_order_script = redis.register_script(REMOVE_ORDER_SCRIPT)
+        self._restore_order_script = redis.register_script(RESTORE_ORDER_SCRIPT)
+        self._depth_script = redis.register_script(DEPTH_SCRIPT)
+        self._market_cost_script = redis.register_script(MARKET_COST_SCRIPT)
 
     async def add_order(
         self,
@@ -19,29 +412,25 @@ class OrderBookRepository:
         qty: int,
         user_id: str,
     ):
-        timestamp = time.time()
-        pipe = self.redis.pipeline()
-        
-        pipe.zadd(
-            f'orderbook:{ticker}:{direction.value}',
-            {order_id: price}
-        )
-        
-        pipe.hset(
-            f'order:{order_id}',
-            mapping={
-                'ticker': ticker,
-                'direction': direction,
-                'price': str(price),
-                'qty': str(qty),
-                'filled': '0',
-                'user_id': user_id,
-                'status': OrderStatus.NEW,
-                'timestamp': str(timestamp)
-            }
+        await self._add_order_script(
+            keys=[
+                version_key(ticker),
+                *side_keys(ticker, direction),
+                seq_key(ticker),
+                order_key(ticker, order_id),
+            ],
+            args=[
+                ticker,
+                events_channel(ticker),
+                direction.value,
+                order_id,
+                price,
+                qty,
+                user_id,
+                OrderStatus.NEW.value,
+                str(time.time()),
+            ],
         )
-        
-        await pipe.execute()
 
     async def find_matches(
         self,
@@ -49,12 +438,12 @@ class OrderBookRepository:
         direction: OrderDirection,
         price: int
     ) -> list[tuple[str, int]]:
-        opposite_dir = OrderDirection.SELL if direction == OrderDirection.BUY else OrderDirection.BUY
-        key = f'orderbook:{ticker}:{opposite_dir.value}'
+        key = book_key(ticker, opposite_direction(direction))
         
+        # Заявки возвращаются сразу в порядке исполнения: по цене, затем по времени (FIFO)
         if direction == OrderDirection.BUY:
             # Для покупки: цена в стакане <= нашей цене (ищем самые дешевые предложения)
-            if price == 0:  # Рыночная заявка - берем лучшее предложение
+            if price == 0:  # Рыночная заявка - берем все предложения
                 orders = await self.redis.zrange(key, 0, -1, withscores=True)
             else:
                 orders = await self.redis.zrangebyscore(
@@ -62,32 +451,58 @@ class OrderBookRepository:
                 )
         else:
             # Для продажи: цена в стакане >= нашей цене (ищем самые дорогие предложения)
-            if price == 0:  # Рыночная заявка - берем лучшее предложение
-                orders = await self.redis.zrevrange(key, 0, 0, withscores=True)
+            if price == 0:  # Рыночная заявка - берем все предложения
+                orders = await self.redis.zrevrange(key, 0, -1, withscores=True)
             else:
-                orders = await self.redis.zrangebyscore(
-                    key, min=price, max='+inf', withscores=True
+                orders = await self.redis.zrevrangebyscore(
+                    key, max='+inf', min=price, withscores=True
                 )
-        
-        # Сортируем по времени добавления (FIFO)
-        if orders:
-            # Получаем timestamp для каждого ордера
-            pipe = self.redis.pipeline()
-            for order_id, _ in orders:
-                pipe.hget(f'order:{order_id}', 'timestamp')
-            timestamps = await pipe.execute()
-            
-            # Сортируем по timestamp
-            sorted_orders = sorted(
-                zip(orders, timestamps),
-                key=lambda x: float(x[1])
-            )
-            return [(order_id, float(score)) for (order_id, score), _ in sorted_orders]
-        return []
 
-    async def update_order_status(self, order_id: str, status: OrderStatus):
+        return [(member_order_id(member), float(score)) for member, score in orders]
+
+    async def match_order(
+        self,
+        ticker: str,
+        direction: OrderDirection,
+        price: int,
+        qty: int,
+        order_id: str = '',
+        user_id: str = '',
+    ) -> list[tuple[str, str, int, int, int, str]]:
+        """Атомарно сводит заявку со стаканом. Остаток лимитной заявки (price > 0) сразу
+        встает в стакан, если передан order_id.
+
+        Возвращает исполнения в порядке приоритета: (id, user_id, цена, объем, остаток, член ZSET)
+        """
+        result = await self._match_order_script(
+            keys=[
+                version_key(ticker),
+                *side_keys(ticker, opposite_direction(direction)),
+                *side_keys(ticker, direction),
+                seq_key(ticker),
+                order_key(ticker, order_id),
+            ],
+            args=[
+                ticker,
+                events_channel(ticker),
+                direction.value,
+                price,
+                qty,
+                order_id,
+                user_id,
+                OrderStatus.NEW.value,
+                str(time.time()),
+                order_key(ticker, ''),
+            ],
+        )
+        return [
+            (result[i], result[i + 1], int(result[i + 2]), int(result[i + 3]), int(result[i + 4]), result[i + 5])
+            for i in range(0, len(result), 6)
+        ]
+
+    async def update_order_status(self, ticker: str, order_id: str, status: OrderStatus):
         await self.redis.hset(
-            f'order:{order_id}', 'status', status.value
+            order_key(ticker, order_id), 'status', status.value
         )
 
     async def get_price_levels(
@@ -97,35 +512,84 @@ class OrderBookRepository:
         limit: int
     ) -> dict[int, int]:
         """Получает агрегированные уровни цен для заданного направления"""
-        key = f'orderbook:{ticker}:{direction.value}'
+        _, depth_key, levels_key = side_keys(ticker, direction)
         
         # Для покупки берем самые высокие цены, для продажи - самые низкие
         if direction == OrderDirection.BUY:
-            orders = await self.redis.zrevrange(key, 0, limit - 1, withscores=True)
+            prices = await self.redis.zrevrange(levels_key, 0, limit - 1)
         else:
-            orders = await self.redis.zrange(key, 0, limit - 1, withscores=True)
-        
-        # Агрегируем объемы по ценам
-        price_levels = {}
-        for order_id, price in orders:
-            order_data = await self.get_order_data(order_id)
-            if order_data:
-                qty = int(order_data['qty']) - int(order_data['filled'])
-                if qty > 0:
-                    price = int(price)
-                    if price in price_levels:
-                        price_levels[price] += qty
-                    else:
-                        price_levels[price] = qty
-        
-        return price_levels
+            prices = await self.redis.zrange(levels_key, 0, limit - 1)
+
+        if not prices:
+            return {}
+
+        qtys = await self.redis.hmget(depth_key, prices)
+        return {int(price): int(qty) for price, qty in zip(prices, qtys) if qty and int(qty) > 0}
+
+    async def get_depth(
+        self,
+        ticker: str,
+        limit: int
+    ) -> tuple[list[tuple[int, int]], list[tuple[int, int]], int]:
+        """Лучшие limit уровней обеих сторон за один запрос: (покупки, продажи, версия)"""
+        _, bid_depth, bid_levels = side_keys(ticker, OrderDirection.BUY)
+        _, ask_depth, ask_levels = side_keys(ticker, OrderDirection.SELL)
+        bids, asks, version = await self._depth_script(
+            keys=[bid_levels, bid_depth, ask_levels, ask_depth, version_key(ticker)],
+            args=[max(limit, 0)],
+        )
+        return (
+            [(int(bids[i]), int(bids[i + 1])) for i in range(0, len(bids), 2)],
+            [(int(asks[i]), int(asks[i + 1])) for i in range(0, len(asks), 2)],
+            int(version),
+        )
+
+    async def get_market_cost(
+        self,
+        ticker: str,
+        direction: OrderDirection,
+        qty: int
+    ) -> int | None:
+        """Стоимость рыночной заявки на qty единиц или None, если ликвидности не хватает"""
+        opposite_dir = opposite_direction(direction)
+        _, depth_key, levels_key = side_keys(ticker, opposite_dir)
+        cost = await self._market_cost_script(
+            keys=[levels_key, depth_key],
+            args=[opposite_dir.value, qty],
+        )
+        return None if int(cost) < 0 else int(cost)
+
+    async def publish_trades(self, ticker: str, trades: list[dict]):
+        if not trades:
+            return
+
+        await self.redis.publish(
+            events_channel(ticker),
+            json.dumps({'type': 'trades', 'ticker': ticker, 'trades': trades})
+        )
+
+    async def get_layout(self) -> int | None:
+        layout = await self.redis.get(LAYOUT_KEY)
+        return int(layout) if layout else None
+
+    async def get_rebuilt(self) -> int:
+        rebuilt = await self.redis.get(REBUILT_KEY)
+        return int(rebuilt) if rebuilt else 0
+
+    async def get_versions(self, ticker: str) -> tuple[int, int]:
+        """Метка пересборки стаканов и версия стакана инструмента за один запрос"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(REBUILT_KEY)
+        pipe.get(version_key(ticker))
+        rebuilt, version = await pipe.execute()
+        return int(rebuilt) if rebuilt else 0, int(version) if version else 0
 
     async def get_best_price(
         self,
         ticker: str,
         direction: str
     ) -> int | None:
-        key = f'orderbook:{ticker}:{'SELL' if direction == 'BUY' else 'BUY'}'
+        key = book_key(ticker, OrderDirection.SELL if direction == 'BUY' else OrderDirection.BUY)
         
         if direction == 'BUY':
             result = await self.redis.zrange(
@@ -140,8 +604,7 @@ class OrderBookRepository:
 
     async def _get_next_best_price(self, ticker: str, direction: OrderDirection) -> int | None:
         """Получаем следующую лучшую цену после частичного исполнения"""
-        opposite_dir = OrderDirection.SELL if direction == OrderDirection.BUY else OrderDirection.BUY
-        key = f'orderbook:{ticker}:{opposite_dir.value}'
+        key = book_key(ticker, opposite_direction(direction))
         
         if direction == OrderDirection.BUY:
             # Берем вторую минимальную цену
@@ -154,35 +617,152 @@ class OrderBookRepository:
 
     async def get_order_data(
         self,
+        ticker: str,
         order_id: str
     ) -> dict[str, str] | None:
-        return await self.redis.hgetall(f'order:{order_id}')
+        return await self.redis.hgetall(order_key(ticker, order_id))
+
+    async def get_book_orders(
+        self,
+        ticker: str,
+        direction: OrderDirection
+    ) -> list[dict[str, str]]:
+        """Возвращает все заявки стороны стакана в порядке исполнения"""
+        key = book_key(ticker, direction)
+        if direction == OrderDirection.BUY:
+            members = await self.redis.zrevrange(key, 0, -1)
+        else:
+            members = await self.redis.zrange(key, 0, -1)
+        if not members:
+            return []
+
+        order_ids = [member_order_id(member) for member in members]
+        pipe = self.redis.pipeline()
+        for order_id in order_ids:
+            pipe.hgetall(order_key(ticker, order_id))
+        orders_data = await pipe.execute()
+
+        return [
+            {**order_data, 'id': order_id}
+            for order_id, order_data in zip(order_ids, orders_data)
+            if order_data
+        ]
+
+    async def apply_fills(
+        self,
+        ticker: str,
+        direction: OrderDirection,
+        fills: list[tuple[str, int, int]]
+    ) -> list[str]:
+        """Зеркалирует результат матчинга: (id заявки, объем сделки, оставшийся объем).
+        Возвращает члены ZSET заявок, '' - заявки в Redis не было"""
+        if not fills:
+            return []
+
+        args = [ticker, events_channel(ticker), direction.value]
+        for order_id, fill_qty, remaining in fills:
+            args.extend((order_id, fill_qty, remaining))
+
+        return await self._apply_fills_script(
+            keys=[
+                version_key(ticker),
+                *side_keys(ticker, direction),
+                *(order_key(ticker, order_id) for order_id, _, _ in fills),
+            ],
+            args=args,
+        )
 
     async def update_order_fill(
         self,
+        ticker: str,
+        direction: OrderDirection,
         order_id: str,
         fill_qty: int
     ):
-        await self.redis.hincrbyfloat(
-            f'order:{order_id}', 'qty', -fill_qty
+        await self._fill_order_script(
+            keys=[version_key(ticker), *side_keys(ticker, direction), order_key(ticker, order_id)],
+            args=[ticker, events_channel(ticker), direction.value, fill_qty],
         )
 
     async def remove_order(
         self,
+        ticker: str,
+        direction: OrderDirection,
         order_id: str
     ):
-        data = await self.get_order_data(order_id)
-        if not data:
-            return
-            
-        pipe = self.redis.pipeline()
-        pipe.zrem(
-            f'orderbook:{data['ticker']}:{data['direction']}',
-            order_id
+        await self._remove_order_script(
+            keys=[version_key(ticker), *side_keys(ticker, direction), order_key(ticker, order_id)],
+            args=[ticker, events_channel(ticker), direction.value, order_id],
         )
-        
-        pipe.delete(f'order:{order_id}')
-        
+
+    async def restore_order(
+        self,
+        ticker: str,
+        direction: OrderDirection,
+        order_id: str,
+        member: str,
+        price: int,
+        qty: int,
+        user_id: str,
+    ):
+        """Возвращает в стакан qty заявки на прежнее место в очереди"""
+        await self._restore_order_script(
+            keys=[version_key(ticker), *side_keys(ticker, direction), order_key(ticker, order_id)],
+            args=[
+                ticker,
+                events_channel(ticker),
+                direction.value,
+                member,
+                price,
+                qty,
+                user_id,
+                OrderStatus.NEW.value,
+                str(time.time()),
+            ],
+        )
+
+    async def replace_orders(self, ticker: str, orders: list[tuple[str, str, OrderDirection, int, int]]):
+        """Заменяет стакан инструмента заявками (id, пользователь, направление, цена, остаток),
+        перечисленными в порядке исполнения каждой стороны"""
+        members = []
+        for direction in OrderDirection:
+            members.extend(await self.redis.zrange(book_key(ticker, direction), 0, -1))
+
+        pipe = self.redis.pipeline(transaction=True)
+        if members:
+            pipe.unlink(*(order_key(ticker, member_order_id(member)) for member in members))
+        for direction in OrderDirection:
+            pipe.unlink(*side_keys(ticker, direction))
+
+        sides = {direction: {} for direction in OrderDirection}
+        depth = {direction: {} for direction in OrderDirection}
+        timestamp = str(time.time())
+        for seq, (order_id, user_id, direction, price, qty) in enumerate(orders, 1):
+            member = make_member(direction, seq, order_id)
+            sides[direction][member] = price
+            depth[direction][price] = depth[direction].get(price, 0) + qty
+            pipe.hset(order_key(ticker, order_id), mapping={
+                'ticker': ticker,
+                'direction': direction.value,
+                'price': price,
+                'qty': qty,
+                'filled': '0',
+                'user_id': user_id,
+                'status': OrderStatus.NEW.value,
+                'timestamp': timestamp,
+                'member': member,
+            })
+
+        for direction in OrderDirection:
+            key, depth_key, levels_key = side_keys(ticker, direction)
+            if sides[direction]:
+                pipe.zadd(key, sides[direction])
+                pipe.hset(depth_key, mapping=depth[direction])
+                pipe.zadd(levels_key, {price: price for price in depth[direction]})
+
+        pipe.set(seq_key(ticker), len(orders))
+        pipe.incr(version_key(ticker))
+        pipe.publish(events_channel(ticker), json.dumps({'type': 'resync', 'ticker': ticker}))
         await pipe.execute()
 
     async def flush_db(self):
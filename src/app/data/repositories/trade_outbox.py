@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.data.repositories.base import SQLAlchemyRepository
+from app.data.models import TradeOutbox
+
+
+class TradeOutboxRepository(SQLAlchemyRepository[TradeOutbox]):
+    # Записи, которые столько раз не удалось перенести, остаются в таблице для разбора вручную
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, session: AsyncSession):
+        super().__init__(session, TradeOutbox)
+
+    async def add_trades(self, timestamp: datetime, transactions: list[dict]) -> None:
+        """Одна строка на транзакцию заявки, сделки лежат в ней списком"""
+        await self.session.execute(insert(TradeOutbox).values(timestamp=timestamp, transactions=transactions))
+
+    async def take(self, limit: int) -> list[TradeOutbox]:
+        """Забирает из таблицы до limit самых старых записей. Удаление откатится вместе
+        с транзакцией, если записать сделки не удалось"""
+        ids = (
+            select(TradeOutbox.id)
+            .where(TradeOutbox.attempts < self.MAX_ATTEMPTS)
+            .order_by(TradeOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            delete(TradeOutbox)
+            .where(TradeOutbox.id.in_(ids.scalar_subquery()))
+            .returning(TradeOutbox)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.scalars(query)
+        return sorted(result.all(), key=lambda entry: entry.id)
+
+    async def mark_first_failed(self) -> tuple[int, int] | None:
+        """Засчитывает неудачную попытку самой старой записи. Возвращает ее id и число попыток"""
+        first_id = select(func.min(TradeOutbox.id)).where(TradeOutbox.attempts < self.MAX_ATTEMPTS)
+        query = (
+            update(TradeOutbox)
+            .where(TradeOutbox.id == first_id.scalar_subquery())
+            .values(attempts=TradeOutbox.attempts + 1)
+            .returning(TradeOutbox.id, TradeOutbox.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(query)
+        return result.tuples().one_or_none()
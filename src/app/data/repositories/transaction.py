@@ -1,4 +1,6 @@
-from sqlalchemy import select
+from typing import AsyncIterator
+
+from sqlalchemy import Row, insert, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.data.repositories.base import SQLAlchemyRepository
@@ -6,15 +8,58 @@ from app.data.models import Transaction
 
 
 class TransactionRepository(SQLAlchemyRepository[Transaction]):
+    COPY_COLUMNS = ('instrument_id', 'wallet_id', 'amount', 'price', 'timestamp')
+
     def __init__(self, session: AsyncSession):
         super().__init__(session, Transaction)
 
-    async def get_all_transactions_by_instrument(self, instrument_id: int, limit: int) -> list[Transaction]:
+    async def add_many(self, transactions: list[dict]) -> None:
+        """Вставляет сделки одним многострочным INSERT"""
+        if not transactions:
+            return
+
+        await self.session.execute(insert(Transaction).values(transactions))
+
+    async def copy_many(self, transactions: list[dict]) -> None:
+        """Вставляет сделки через COPY в транзакции сессии, для больших пачек"""
+        if not transactions:
+            return
+
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        async with raw_connection.driver_connection.cursor() as cursor:
+            async with cursor.copy(f"COPY transactions ({', '.join(self.COPY_COLUMNS)}) FROM STDIN") as copy:
+                for transaction in transactions:
+                    await copy.write_row([transaction[column] for column in self.COPY_COLUMNS])
+
+    async def get_all_transactions_by_instrument(
+        self,
+        instrument_id: int,
+        limit: int,
+        before_id: int | None = None,
+    ) -> list[Transaction]:
+        """Сделки от новых к старым. Курсор before_id - id последней сделки предыдущей страницы"""
         query = (
             select(Transaction)
             .where(Transaction.instrument_id == instrument_id)
-            .order_by(Transaction.timestamp.desc())
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
             .limit(limit)
         )
+        if before_id is not None:
+            before_timestamp = select(Transaction.timestamp).where(Transaction.id == before_id).scalar_subquery()
+            query = query.where(tuple_(Transaction.timestamp, Transaction.id) < tuple_(before_timestamp, before_id))
+
         result = await self.session.scalars(query)
-        return result
+        return result.all()
+
+    async def stream_by_instrument(self, instrument_id: int, chunk_size: int = 1000) -> AsyncIterator[list[Row]]:
+        """Все сделки инструмента от старых к новым пачками через серверный курсор"""
+        query = (
+            select(Transaction.id, Transaction.amount, Transaction.price, Transaction.timestamp)
+            .where(Transaction.instrument_id == instrument_id)
+            .order_by(Transaction.timestamp, Transaction.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await self.session.stream(query)
+        async for rows in result.partitions():
+            yield rows
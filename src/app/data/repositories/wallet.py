@@ -16,6 +16,11 @@ class WalletRepository(SQLAlchemyRepository[Wallet]):
         result = await self.session.scalar(query)
         return result
 
+    async def get_wallet_ids_by_user_ids(self, user_ids: list[uuid.UUID]) -> dict[uuid.UUID, int]:
+        query = select(Wallet.user_id, Wallet.id).where(Wallet.user_id.in_(user_ids))
+        result = await self.session.execute(query)
+        return {user_id: wallet_id for user_id, wallet_id in result}
+
     async def get_wallet_by_user_id(self, user_id: uuid.UUID) -> Wallet | None:
         query = (
             select(Wallet)
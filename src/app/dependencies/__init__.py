@@ -1,6 +1,9 @@
 from .access_control import get_admin_user, get_current_user
 from .service_factories import (
+    get_candle_service,
     get_instrument_service,
+    get_order_dispatcher,
+    get_orderbook_broadcaster,
     get_order_service,
     get_user_service,
     get_transaction_service,
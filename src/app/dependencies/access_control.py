@@ -21,17 +21,14 @@ async def get_current_user(
     if not authorization or not authorization.startswith('TOKEN '):
         raise InvalidAuthorizationFormatException()
 
-    # TODO add cache
-
     api_key = authorization.split(' ')[1]
 
     try:
-        async with user_service.session.begin():
-            user = await user_service.get_user_by_api_key(api_key=api_key)
+        user = await user_service.authenticate(api_key=api_key)
     except NotFoundException:
         raise InvalidAPIKeyException()
 
-    return UserResponse.model_validate(user)
+    return user
 
 
 async def get_admin_user(
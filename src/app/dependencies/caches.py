@@ -0,0 +1,47 @@
+import logging
+import uuid
+
+from config import settings
+from database import async_session_maker
+from redis_client import get_redis
+
+from app.data.cache import ApiKeyCache, InstrumentCache
+from app.data.repositories import CacheInvalidationRepository, InstrumentRepository
+
+
+instrument_cache = InstrumentCache()
+api_key_cache = ApiKeyCache(ttl=settings.API_KEY_CACHE_TTL, max_size=settings.API_KEY_CACHE_SIZE)
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_caches():
+    async with async_session_maker() as session:
+        await InstrumentRepository(session, instrument_cache).warm_cache()
+
+
+async def listen_cache_invalidation():
+    """Сбрасывает кэши процесса по оповещениям из других процессов"""
+    async for message in CacheInvalidationRepository(get_redis()).listen():
+        try:
+            invalidate_caches(message)
+        except Exception:
+            # Непонятное оповещение не должно останавливать подписку, а кэш лучше сбросить целиком
+            logger.exception('Failed to apply cache invalidation %r', message)
+            invalidate_caches(None)
+
+
+def invalidate_caches(message: tuple[str, str] | None):
+    """Сбрасывает кэш или его запись, None - все кэши"""
+    if message is None:
+        instrument_cache.invalidate()
+        api_key_cache.invalidate()
+        return
+
+    name, key = message
+    if name == InstrumentCache.NAME:
+        instrument_cache.invalidate()
+    elif name == ApiKeyCache.NAME and key:
+        api_key_cache.invalidate_user(uuid.UUID(key))
+    elif name == ApiKeyCache.NAME:
+        api_key_cache.invalidate()
@@ -3,62 +3,123 @@ from typing import Annotated
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from redis.asyncio import Redis
 from config import settings
-from database import get_async_session
+from database import async_session_maker, get_async_session
+from redis_client import get_redis
+from app.dependencies.caches import api_key_cache, instrument_cache
 
+from app.data.cache import OrderBookSnapshotCache
 from app.data.repositories import (
     BalanceRepository,
+    CacheInvalidationRepository,
+    CandleRepository,
     InstrumentRepository,
+    MatcherQueueRepository,
+    OrderBookBroadcaster,
     OrderRepository,
     OrderBookRepository,
+    TradeOutboxRepository,
     TransactionRepository,
     UserRepository,
     WalletRepository,
 )
 from app.domain.services import (
+    CandleService,
     InstrumentService,
     OrderService,
     TransactionService,
     UserService,
     WalletService,
 )
+from app.domain.enums import MatchingMode, SequencerMode, TradeWriterMode
+from app.domain.matching import MatchingEngine, MatchingJournal, TickerSequencer
+from app.domain.matching.dispatcher import MatcherOrderDispatcher, OrderDispatcher
 
 
+matching_engine = MatchingEngine()
+ticker_sequencer = TickerSequencer()
+# Журнал пишет только матчер: он открывает его при старте, в остальных процессах запись выключена
+matching_journal = MatchingJournal(
+    settings.MATCHING_JOURNAL_PATH,
+    chunk_size=settings.MATCHING_JOURNAL_CHUNK_SIZE,
+    fsync=settings.MATCHING_JOURNAL_FSYNC,
+) if settings.MATCHING_JOURNAL_PATH else None
+orderbook_snapshot_cache = OrderBookSnapshotCache(ttl=settings.ORDERBOOK_SNAPSHOT_TTL)
+orderbook_broadcaster = OrderBookBroadcaster(redis_factory=get_redis)
+
+
+def get_orderbook_broadcaster() -> OrderBookBroadcaster:
+    return orderbook_broadcaster
+
+
+def get_candle_service(session: Annotated[AsyncSession, Depends(get_async_session)]) -> CandleService:
+    candle_repo = CandleRepository(session)
+    instrument_repo = InstrumentRepository(session, instrument_cache)
+    return CandleService(session, candle_repo, instrument_repo)
+
 def get_instrument_service(session: Annotated[AsyncSession, Depends(get_async_session)]) -> InstrumentService:
-    instrument_repo = InstrumentRepository(session)
-    return InstrumentService(session, instrument_repo)
+    instrument_repo = InstrumentRepository(session, instrument_cache)
+    cache_invalidation = CacheInvalidationRepository(redis=get_redis())
+    return InstrumentService(session, instrument_repo, cache_invalidation)
 
 def get_order_service(session: Annotated[AsyncSession, Depends(get_async_session)]) -> OrderService:
-    redis = Redis(
-        host='redis',
-        port=6379,
-        password=settings.REDIS_PASSWORD,
-        decode_responses=True
-    )
-    orderbook = OrderBookRepository(redis=redis)
+    orderbook = OrderBookRepository(redis=get_redis())
 
     balance_repo = BalanceRepository(session)
-    instrument_repo = InstrumentRepository(session)
+    candle_repo = CandleRepository(session)
+    instrument_repo = InstrumentRepository(session, instrument_cache)
     order_repo = OrderRepository(session)
     transaction_repo = TransactionRepository(session)
     wallet_repo = WalletRepository(session)
-    return OrderService(session, balance_repo, instrument_repo, order_repo, orderbook, transaction_repo, wallet_repo)
+    matching_mode = MatchingMode(settings.ORDERBOOK_MATCHING)
+    trade_outbox = None
+    if TradeWriterMode(settings.TRADE_WRITER) == TradeWriterMode.OUTBOX:
+        trade_outbox = TradeOutboxRepository(session)
+    return OrderService(
+        session,
+        balance_repo,
+        candle_repo,
+        instrument_repo,
+        order_repo,
+        orderbook,
+        transaction_repo,
+        wallet_repo,
+        matching_mode,
+        matching_engine,
+        orderbook_snapshot_cache,
+        matching_journal,
+        trade_outbox,
+    )
+
+def get_order_dispatcher(order_service: Annotated[OrderService, Depends(get_order_service)]) -> OrderDispatcher:
+    if SequencerMode(settings.ORDER_SEQUENCER) == SequencerMode.MATCHER:
+        matcher_queue = MatcherQueueRepository(redis=get_redis())
+        return MatcherOrderDispatcher(order_service, matcher_queue, settings.MATCHER_TIMEOUT)
+    return OrderDispatcher(order_service, ticker_sequencer)
 
 def get_transaction_service(session: Annotated[AsyncSession, Depends(get_async_session)]) -> TransactionService:
-    instrument_repo = InstrumentRepository(session)
+    instrument_repo = InstrumentRepository(session, instrument_cache)
     transaction_repo = TransactionRepository(session)
-    return TransactionService(session, instrument_repo, transaction_repo)
+    return TransactionService(session, instrument_repo, transaction_repo, async_session_maker)
 
 def get_user_service(session: Annotated[AsyncSession, Depends(get_async_session)]) -> UserService:
     balance_repo = BalanceRepository(session)
-    instrument_repo = InstrumentRepository(session)
+    instrument_repo = InstrumentRepository(session, instrument_cache)
     user_repo = UserRepository(session)
     wallet_repo = WalletRepository(session)
-    return UserService(session, balance_repo, instrument_repo, user_repo, wallet_repo)
+    cache_invalidation = CacheInvalidationRepository(redis=get_redis())
+    return UserService(
+        session,
+        balance_repo,
+        instrument_repo,
+        user_repo,
+        wallet_repo,
+        api_key_cache,
+        cache_invalidation,
+    )
 
 def get_wallet_service(session: Annotated[AsyncSession, Depends(get_async_session)]) -> WalletService:
     balance_repo = BalanceRepository(session)
-    instrument_repo = InstrumentRepository(session)
+    instrument_repo = InstrumentRepository(session, instrument_cache)
     wallet_repo = WalletRepository(session)
     return WalletService(session, balance_repo, instrument_repo, wallet_repo)
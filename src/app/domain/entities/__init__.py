@@ -1,7 +1,10 @@
 from .base import BaseSchema
 from .balance import BalancesResponse
+from .candle import CandleResponse
 from .instrument import InstrumentCreate, InstrumentResponse
+from .metrics import MetricsResponse, PoolMetricsResponse
 from .order import (
+    BatchOrderResponse,
     LevelsResponse,
     LimitOrderCreate,
     LimitOrderResponse,
@@ -11,6 +14,6 @@ from .order import (
     OrderBookResponse,
     SuccessOrderResponse,
 )
-from .transaction import TransactionResponse
+from .transaction import TransactionHistoryResponse, TransactionResponse
 from .user import UserCreate, UserResponse
 from .wallet import Deposit, Withdraw
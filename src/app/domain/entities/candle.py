@@ -0,0 +1,12 @@
+from datetime import datetime
+
+from app.domain.entities import BaseSchema
+
+
+class CandleResponse(BaseSchema):
+    timestamp: datetime
+    open: int
+    high: int
+    low: int
+    close: int
+    volume: int
@@ -0,0 +1,16 @@
+from app.domain.entities import BaseSchema
+
+
+class PoolMetricsResponse(BaseSchema):
+    size: int
+    in_use: int
+    idle: int
+    checkouts: int
+    timeouts: int
+    wait_avg_ms: float
+    wait_max_ms: float
+
+
+class MetricsResponse(BaseSchema):
+    database: PoolMetricsResponse
+    redis: PoolMetricsResponse
@@ -37,6 +37,12 @@ class SuccessOrderResponse(BaseSchema):
     order_id: uuid.UUID
 
 
+class BatchOrderResponse(BaseSchema):
+    success: bool = True
+    order_id: uuid.UUID | None = None
+    detail: str | None = None
+
+
 class LevelsResponse(BaseSchema):
     price: int
     qty: int
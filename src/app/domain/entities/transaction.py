@@ -9,3 +9,7 @@ class TransactionResponse(BaseSchema):
     amount: int
     price: int
     timestamp: datetime
+
+
+class TransactionHistoryResponse(TransactionResponse):
+    id: int
@@ -1,2 +1,3 @@
 from .user import UserRole
-from .order import OrderDirection, OrderStatus, OrderType
+from .order import MatchingMode, OrderDirection, OrderStatus, OrderType, SequencerMode
+from .transaction import CandleInterval, ExportFormat, TradeWriterMode
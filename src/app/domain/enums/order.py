@@ -16,3 +16,14 @@ class OrderStatus(str, Enum):
 class OrderDirection(str, Enum):
     BUY = 'BUY'
     SELL = 'SELL'
+
+
+class MatchingMode(str, Enum):
+    REDIS = 'redis'
+    SCRIPT = 'script'
+    MEMORY = 'memory'
+
+
+class SequencerMode(str, Enum):
+    LOCAL = 'local'
+    MATCHER = 'matcher'
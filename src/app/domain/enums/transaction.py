@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from enum import Enum
+
+
+class ExportFormat(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class TradeWriterMode(str, Enum):
+    INLINE = 'inline'
+    OUTBOX = 'outbox'
+
+
+class CandleInterval(str, Enum):
+    MINUTE = '1m'
+    HOUR = '1h'
+    DAY = '1d'
+
+    def truncate(self, timestamp: datetime) -> datetime:
+        """Начало свечи, в которую попадает момент времени в UTC"""
+        timestamp = timestamp.astimezone(timezone.utc).replace(second=0, microsecond=0)
+        if self != CandleInterval.MINUTE:
+            timestamp = timestamp.replace(minute=0)
+        if self == CandleInterval.DAY:
+            timestamp = timestamp.replace(hour=0)
+        return timestamp
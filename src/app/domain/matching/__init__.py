@@ -0,0 +1,5 @@
+from .book import BookOrder, Fill, OrderBook
+from .engine import MatchingEngine
+from .journal import JournalReader, JournalRecord, JournalRecordType, MatchingJournal, replay
+from .sequencer import TickerSequencer
+from .settlement import Settlement
@@ -0,0 +1,209 @@
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator
+
+from app.domain.enums import OrderDirection
+
+
+@dataclass(slots=True)
+class BookOrder:
+    order_id: str
+    user_id: str
+    direction: OrderDirection
+    price: int
+    qty: int
+
+
+@dataclass(slots=True, frozen=True)
+class Fill:
+    maker_id: str
+    maker_user_id: str
+    maker_price: int
+    qty: int
+    maker_remaining: int
+
+
+class BookSide:
+    """Одна сторона стакана: отсортированные уровни цен с FIFO-очередью заявок на каждом"""
+
+    def __init__(self, direction: OrderDirection):
+        self.direction = direction
+        # Для покупок лучшая цена - максимальная, для продаж - минимальная.
+        # Ключи храним по возрастанию так, чтобы лучший уровень всегда был в конце списка
+        self._sign = 1 if direction == OrderDirection.BUY else -1
+        self._keys: list[int] = []
+        self._levels: dict[int, deque[BookOrder]] = {}
+        self._totals: dict[int, int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._keys)
+
+    def best_price(self) -> int | None:
+        return self._keys[-1] * self._sign if self._keys else None
+
+    def add(self, order: BookOrder, front: bool = False):
+        level = self._levels.get(order.price)
+        if level is None:
+            level = deque()
+            self._levels[order.price] = level
+            self._totals[order.price] = 0
+            key = order.price * self._sign
+            self._keys.insert(bisect_left(self._keys, key), key)
+
+        if front:
+            level.appendleft(order)
+        else:
+            level.append(order)
+        self._totals[order.price] += order.qty
+
+    def reduce(self, price: int, qty: int):
+        self._totals[price] -= qty
+        if self._totals[price] <= 0:
+            self._remove_level(price)
+
+    def best_level(self) -> tuple[int, deque[BookOrder]]:
+        price = self._keys[-1] * self._sign
+        return price, self._levels[price]
+
+    def levels(self, limit: int | None = None) -> list[tuple[int, int]]:
+        keys = self._keys if limit is None else self._keys[-limit:] if limit > 0 else []
+        return [(key * self._sign, self._totals[key * self._sign]) for key in reversed(keys)]
+
+    def orders(self) -> Iterator[BookOrder]:
+        """Заявки стороны в порядке исполнения"""
+        for key in reversed(self._keys):
+            for order in self._levels[key * self._sign]:
+                if order.qty:
+                    yield order
+
+    def _remove_level(self, price: int):
+        key = price * self._sign
+        idx = bisect_left(self._keys, key)
+        if idx < len(self._keys) and self._keys[idx] == key:
+            del self._keys[idx]
+        self._levels.pop(price, None)
+        self._totals.pop(price, None)
+
+
+class OrderBook:
+    """Стакан одного инструмента в памяти процесса"""
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.bids = BookSide(OrderDirection.BUY)
+        self.asks = BookSide(OrderDirection.SELL)
+        self._orders: dict[str, BookOrder] = {}
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    def side(self, direction: OrderDirection) -> BookSide:
+        return self.bids if direction == OrderDirection.BUY else self.asks
+
+    def add(self, order: BookOrder):
+        if order.qty <= 0 or order.order_id in self._orders:
+            return
+        self._orders[order.order_id] = order
+        self.side(order.direction).add(order)
+
+    def cancel(self, order_id: str) -> BookOrder | None:
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+
+        # Заявка остается в очереди уровня с нулевым объемом и пропускается при матчинге
+        qty, order.qty = order.qty, 0
+        self.side(order.direction).reduce(order.price, qty)
+        return order
+
+    def reduce(self, order_id: str, qty: int):
+        """Уменьшает остаток заявки без матчинга, используется при восстановлении из журнала"""
+        order = self._orders.get(order_id)
+        if order is None:
+            return
+
+        qty = min(qty, order.qty)
+        order.qty -= qty
+        if order.qty == 0:
+            del self._orders[order_id]
+        self.side(order.direction).reduce(order.price, qty)
+
+    def revert_fill(self, direction: OrderDirection, fill: Fill):
+        """Возвращает встречной заявке стороны direction объем исполнения. Исполняется всегда
+        голова очереди уровня, поэтому при откате в обратном порядке заявки встают на прежние места"""
+        order = self._orders.get(fill.maker_id)
+        if order is not None:
+            order.qty += fill.qty
+            self.side(direction).reduce(order.price, -fill.qty)
+            return
+
+        order = BookOrder(
+            order_id=fill.maker_id,
+            user_id=fill.maker_user_id,
+            direction=direction,
+            price=fill.maker_price,
+            qty=fill.qty,
+        )
+        self._orders[order.order_id] = order
+        self.side(direction).add(order, front=True)
+
+    def orders(self) -> list[BookOrder]:
+        return [*self.bids.orders(), *self.asks.orders()]
+
+    def reconcile(self, orders: list[BookOrder]) -> int:
+        """Приводит стакан к заявкам orders, перечисленным в порядке выставления: остатки
+        берутся из них, лишние заявки снимаются, недостающие встают в конец очереди.
+        Возвращает число исправленных заявок"""
+        actual = {order.order_id: order for order in orders}
+        changed = 0
+        for order in list(self._orders.values()):
+            target = actual.get(order.order_id)
+            if target is None or (target.direction, target.price) != (order.direction, order.price):
+                self.cancel(order.order_id)
+                changed += 1
+            elif target.qty != order.qty:
+                self.side(order.direction).reduce(order.price, order.qty - target.qty)
+                order.qty = target.qty
+                changed += 1
+
+        for order in orders:
+            if order.order_id not in self._orders:
+                self.add(order)
+                changed += 1
+        return changed
+
+    def match(self, direction: OrderDirection, price: int, qty: int) -> list[Fill]:
+        """Сводит входящую заявку с противоположной стороной. price == 0 - рыночная заявка"""
+        opposite = self.asks if direction == OrderDirection.BUY else self.bids
+        fills = []
+
+        while qty > 0 and opposite:
+            level_price, level = opposite.best_level()
+            if price and (level_price > price if direction == OrderDirection.BUY else level_price < price):
+                break
+
+            while qty > 0 and level:
+                maker = level[0]
+                if maker.qty == 0:
+                    level.popleft()
+                    continue
+
+                fill_qty = min(maker.qty, qty)
+                maker.qty -= fill_qty
+                qty -= fill_qty
+                fills.append(Fill(
+                    maker_id=maker.order_id,
+                    maker_user_id=maker.user_id,
+                    maker_price=maker.price,
+                    qty=fill_qty,
+                    maker_remaining=maker.qty,
+                ))
+
+                if maker.qty == 0:
+                    level.popleft()
+                    del self._orders[maker.order_id]
+
+                opposite.reduce(level_price, fill_qty)
+
+        return fills
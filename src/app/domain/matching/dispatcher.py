@@ -0,0 +1,173 @@
+import logging
+import uuid
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+
+from app.data.repositories import MatcherQueueRepository
+from app.domain.entities import BatchOrderResponse, LimitOrderCreate, MarketOrderCreate, SuccessOrderResponse
+from app.domain.matching.sequencer import TickerSequencer
+from app.domain.services import OrderService
+from app.api.exceptions.exceptions import AppException
+from app.api.exceptions.schemas import SuccessResponse
+
+
+order_create_adapter = TypeAdapter(LimitOrderCreate | MarketOrderCreate)
+batch_create_adapter = TypeAdapter(list[LimitOrderCreate | MarketOrderCreate])
+
+logger = logging.getLogger(__name__)
+
+
+def group_by_ticker(orders: list[LimitOrderCreate | MarketOrderCreate]) -> dict[str, list[int]]:
+    """Индексы заявок пакета, сгруппированные по инструменту"""
+    groups = {}
+    for index, order in enumerate(orders):
+        groups.setdefault(order.ticker, []).append(index)
+    return groups
+
+
+def group_failed(exc: Exception, size: int) -> list[BatchOrderResponse]:
+    """Ответы по заявкам части пакета, которая не выполнилась: ее транзакция откатилась целиком"""
+    if isinstance(exc, (AppException, HTTPException)):
+        detail = exc.detail
+    else:
+        logger.error('Batch order group failed', exc_info=exc)
+        detail = 'Internal server error'
+    return [BatchOrderResponse(success=False, detail=detail) for _ in range(size)]
+
+
+async def execute_command(order_service: OrderService, command: dict) -> dict:
+    """Выполняет команду матчеру и возвращает ответ в виде словаря"""
+    try:
+        if command['action'] == 'create':
+            result = await order_service.create_order(
+                user_id=uuid.UUID(command['user_id']),
+                order=order_create_adapter.validate_python(command['order']),
+            )
+        elif command['action'] == 'create_batch':
+            result = await order_service.create_orders(
+                user_id=uuid.UUID(command['user_id']),
+                orders=batch_create_adapter.validate_python(command['orders']),
+            )
+        elif command['action'] == 'cancel':
+            result = await order_service.cancel_order(
+                order_id=uuid.UUID(command['order_id']),
+                user_id=uuid.UUID(command['user_id']),
+            )
+        else:
+            return {'ok': False, 'status_code': 400, 'detail': 'Unknown action'}
+    except (AppException, HTTPException) as exc:
+        return {'ok': False, 'status_code': exc.status_code, 'detail': exc.detail}
+
+    if isinstance(result, list):
+        return {'ok': True, 'result': [item.model_dump(mode='json') for item in result]}
+    return {'ok': True, 'result': result.model_dump(mode='json')}
+
+
+class OrderDispatcher:
+    """Направляет все заявки инструмента в один последовательный обработчик внутри процесса"""
+
+    def __init__(self, order_service: OrderService, sequencer: TickerSequencer):
+        self.order_service = order_service
+        self.sequencer = sequencer
+
+    async def create_order(self, user_id: uuid.UUID, order: LimitOrderCreate | MarketOrderCreate) -> SuccessOrderResponse:
+        return await self.sequencer.submit(
+            order.ticker,
+            lambda: self.order_service.create_order(user_id=user_id, order=order)
+        )
+
+    async def create_orders(
+        self,
+        user_id: uuid.UUID,
+        orders: list[LimitOrderCreate | MarketOrderCreate],
+    ) -> list[BatchOrderResponse]:
+        # Пакет делится по инструментам: каждая часть проходит через свой обработчик и
+        # фиксируется отдельно, поэтому сбой одной части не скрывает уже выставленные заявки
+        results = [None] * len(orders)
+        for ticker, indexes in group_by_ticker(orders).items():
+            group = [orders[index] for index in indexes]
+            try:
+                group_results = await self.sequencer.submit(
+                    ticker,
+                    lambda: self.order_service.create_orders(user_id=user_id, orders=group)
+                )
+            except Exception as exc:
+                group_results = group_failed(exc, len(indexes))
+            for index, result in zip(indexes, group_results):
+                results[index] = result
+        return results
+
+    async def cancel_order(self, order_id: uuid.UUID, user_id: uuid.UUID) -> SuccessResponse:
+        ticker = await self.order_service.get_order_ticker(order_id=order_id)
+        return await self.sequencer.submit(
+            ticker,
+            lambda: self.order_service.cancel_order(order_id=order_id, user_id=user_id)
+        )
+
+
+class MatcherOrderDispatcher(OrderDispatcher):
+    """Отправляет заявки выделенному процессу-матчеру и ждет результат"""
+
+    def __init__(self, order_service: OrderService, matcher_queue: MatcherQueueRepository, timeout: float):
+        self.order_service = order_service
+        self.matcher_queue = matcher_queue
+        self.timeout = timeout
+
+    async def create_order(self, user_id: uuid.UUID, order: LimitOrderCreate | MarketOrderCreate) -> SuccessOrderResponse:
+        result = await self._call({
+            'action': 'create',
+            'ticker': order.ticker,
+            'user_id': str(user_id),
+            'order': order.model_dump(mode='json'),
+        })
+        return SuccessOrderResponse.model_validate(result)
+
+    async def create_orders(
+        self,
+        user_id: uuid.UUID,
+        orders: list[LimitOrderCreate | MarketOrderCreate],
+    ) -> list[BatchOrderResponse]:
+        results = [None] * len(orders)
+        for ticker, indexes in group_by_ticker(orders).items():
+            try:
+                group_results = await self._call({
+                    'action': 'create_batch',
+                    'ticker': ticker,
+                    'user_id': str(user_id),
+                    'orders': [orders[index].model_dump(mode='json') for index in indexes],
+                })
+            except Exception as exc:
+                group_results = group_failed(exc, len(indexes))
+            for index, result in zip(indexes, group_results):
+                results[index] = BatchOrderResponse.model_validate(result)
+        return results
+
+    async def cancel_order(self, order_id: uuid.UUID, user_id: uuid.UUID) -> SuccessResponse:
+        ticker = await self.order_service.get_order_ticker(order_id=order_id)
+        result = await self._call({
+            'action': 'cancel',
+            'ticker': ticker,
+            'order_id': str(order_id),
+            'user_id': str(user_id),
+        })
+        return SuccessResponse.model_validate(result)
+
+    async def _call(self, command: dict) -> dict:
+        request_id = await self.matcher_queue.push_command(command, timeout=self.timeout)
+        reply = await self.matcher_queue.wait_reply(request_id, timeout=self.timeout)
+
+        if reply is None:
+            # Команда, которую матчер еще не начал, снимается и уже не выполнится
+            if await self.matcher_queue.expire_command(request_id):
+                raise HTTPException(status_code=504, detail='Matcher did not respond in time, the command was not executed')
+
+            # Матчер уже выполняет команду: ответ на нее отражает реальный результат
+            reply = await self.matcher_queue.wait_reply(request_id, timeout=self.timeout)
+            if reply is None:
+                raise HTTPException(status_code=504, detail='Matcher is still executing the command, its result is unknown')
+
+        if not reply['ok']:
+            raise HTTPException(status_code=reply['status_code'], detail=reply['detail'])
+
+        return reply['result']
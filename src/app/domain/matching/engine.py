@@ -0,0 +1,75 @@
+import asyncio
+
+from app.data.repositories import OrderBookRepository
+from app.domain.enums import OrderDirection
+from app.domain.matching.book import BookOrder, Fill, OrderBook
+
+
+class MatchingEngine:
+    """Держит стаканы инструментов в памяти процесса, Redis используется как зеркало.
+
+    Стакан загружается из Redis при первом обращении к тикеру, после чего
+    матчинг не делает сетевых запросов. Состояние корректно только пока
+    процесс единственный, кто меняет стакан инструмента.
+    """
+
+    def __init__(self):
+        self._books: dict[str, OrderBook] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def get_book(self, ticker: str, orderbook: OrderBookRepository) -> OrderBook:
+        book = self._books.get(ticker)
+        if book is not None:
+            return book
+
+        lock = self._locks.setdefault(ticker, asyncio.Lock())
+        async with lock:
+            book = self._books.get(ticker)
+            if book is None:
+                book = OrderBook(ticker)
+                for direction in OrderDirection:
+                    for data in await orderbook.get_book_orders(ticker, direction):
+                        book.add(BookOrder(
+                            order_id=data['id'],
+                            user_id=data['user_id'],
+                            direction=direction,
+                            price=int(data['price']),
+                            qty=int(data['qty']) - int(data['filled']),
+                        ))
+                self._books[ticker] = book
+        return book
+
+    async def match(
+        self,
+        orderbook: OrderBookRepository,
+        ticker: str,
+        direction: OrderDirection,
+        price: int,
+        qty: int,
+    ) -> list[Fill]:
+        book = await self.get_book(ticker, orderbook)
+        return book.match(direction, price, qty)
+
+    async def add_order(self, orderbook: OrderBookRepository, ticker: str, order: BookOrder):
+        book = await self.get_book(ticker, orderbook)
+        book.add(order)
+
+    async def cancel_order(self, orderbook: OrderBookRepository, ticker: str, order_id: str):
+        book = await self.get_book(ticker, orderbook)
+        book.cancel(order_id)
+
+    async def revert_fills(self, orderbook: OrderBookRepository, ticker: str, direction: OrderDirection, fills: list[Fill]):
+        """Откатывает исполнения встречных заявок стороны direction"""
+        book = await self.get_book(ticker, orderbook)
+        for fill in reversed(fills):
+            book.revert_fill(direction, fill)
+
+    def restore(self, books: dict[str, OrderBook]):
+        """Подменяет стаканы восстановленными, например из журнала матчинга"""
+        self._books.update(books)
+
+    def reset(self, ticker: str | None = None):
+        if ticker is None:
+            self._books.clear()
+        else:
+            self._books.pop(ticker, None)
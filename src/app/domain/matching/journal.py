@@ -0,0 +1,261 @@
+import mmap
+import os
+import struct
+import uuid
+import zlib
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Iterator
+
+from app.domain.enums import OrderDirection
+from app.domain.matching.book import BookOrder, Fill, OrderBook
+
+
+class JournalRecordType(IntEnum):
+    ORDER = 1
+    FILL = 2
+    CANCEL = 3
+    EPOCH = 4
+
+
+@dataclass(slots=True, frozen=True)
+class JournalRecord:
+    seq: int
+    type: JournalRecordType
+    ticker: str
+    order_id: str
+    user_id: str = ''
+    maker_id: str = ''
+    direction: OrderDirection | None = None
+    price: int = 0
+    qty: int = 0
+
+
+# Длина данных, номер записи, тип | направление, id заявки, пользователя, встречной заявки, цена, объем | тикер | crc32
+HEADER = struct.Struct('<IQB')
+BODY = struct.Struct('<B16s16s16sqq')
+CRC = struct.Struct('<I')
+
+DIRECTIONS = {OrderDirection.BUY: 1, OrderDirection.SELL: 2}
+DIRECTION_CODES = {code: direction for direction, code in DIRECTIONS.items()}
+EMPTY_ID = bytes(16)
+
+
+def encode_id(value: str) -> bytes:
+    return uuid.UUID(value).bytes if value else EMPTY_ID
+
+
+def decode_id(value: bytes) -> str:
+    return str(uuid.UUID(bytes=value)) if value != EMPTY_ID else ''
+
+
+class JournalReader:
+    """Читает журнал через mmap. Чтение останавливается на первой недописанной или
+    поврежденной записи, ее смещение остается в end. Номер пересборки стаканов,
+    с которой начат журнал, остается в epoch"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.end = 0
+        self.last_seq = 0
+        self.epoch = None
+
+    def __iter__(self) -> Iterator[JournalRecord]:
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+
+        with open(self.path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset + HEADER.size <= len(data):
+                length, seq, record_type = HEADER.unpack_from(data, offset)
+                end = offset + HEADER.size + length + CRC.size
+                if length < BODY.size or end > len(data):
+                    break
+
+                (crc,) = CRC.unpack_from(data, end - CRC.size)
+                if zlib.crc32(data[offset:end - CRC.size]) != crc:
+                    break
+
+                body_offset = offset + HEADER.size
+                direction, order_id, user_id, maker_id, price, qty = BODY.unpack_from(data, body_offset)
+                ticker = data[body_offset + BODY.size:end - CRC.size].decode()
+
+                offset = self.end = end
+                self.last_seq = seq
+                if record_type == JournalRecordType.EPOCH:
+                    self.epoch = qty
+                yield JournalRecord(
+                    seq=seq,
+                    type=JournalRecordType(record_type),
+                    ticker=ticker,
+                    order_id=decode_id(order_id),
+                    user_id=decode_id(user_id),
+                    maker_id=decode_id(maker_id),
+                    direction=DIRECTION_CODES.get(direction),
+                    price=price,
+                    qty=qty,
+                )
+
+
+def replay(records: Iterator[JournalRecord]) -> dict[str, OrderBook]:
+    """Восстанавливает стаканы по записям журнала. Матчинг не повторяется: заявка ставится
+    в стакан целиком, а исполнения уменьшают остатки обеих сторон"""
+    books: dict[str, OrderBook] = {}
+    for record in records:
+        if record.type == JournalRecordType.EPOCH:
+            continue
+
+        book = books.get(record.ticker)
+        if book is None:
+            book = books[record.ticker] = OrderBook(record.ticker)
+
+        if record.type == JournalRecordType.ORDER:
+            # У рыночной заявки нет цены, в стакан она не попадает
+            if record.price:
+                book.add(BookOrder(
+                    order_id=record.order_id,
+                    user_id=record.user_id,
+                    direction=record.direction,
+                    price=record.price,
+                    qty=record.qty,
+                ))
+        elif record.type == JournalRecordType.FILL:
+            book.reduce(record.order_id, record.qty)
+            book.reduce(record.maker_id, record.qty)
+        elif record.type == JournalRecordType.CANCEL:
+            book.cancel(record.order_id)
+
+    return books
+
+
+class MatchingJournal:
+    """Последовательный журнал принятых заявок, исполнений и отмен.
+
+    Записи одной операции дописываются в файл сразу после коммита, до ответа клиенту,
+    и переживают падение процесса. fsync, если включен, делается блоками: после
+    chunk_size байт и по таймеру через flush. Писать в журнал должен один процесс - матчер
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 20, fsync: bool = False):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.fsync = fsync
+        self.seq = 0
+        self._unsynced = 0
+        self._file = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def open(self, epoch: int) -> dict[str, OrderBook] | None:
+        """Восстанавливает стаканы из журнала. Возвращает None, если журнала еще нет или
+        он начат до пересборки стаканов epoch: тогда стаканы берутся из Redis. Писать
+        в журнал можно после compact, который переписывает его одними текущими заявками"""
+        reader = JournalReader(self.path)
+        books = replay(reader)
+        self.seq = reader.last_seq
+        if not reader.end or reader.epoch != epoch:
+            return None
+        return books
+
+    def compact(self, books: dict[str, OrderBook], epoch: int):
+        """Заменяет журнал записями о заявках, которые сейчас стоят в стаканах"""
+        self.close()
+
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(self._encode(JournalRecordType.EPOCH, '', '', '', '', None, 0, epoch))
+            for book in books.values():
+                for order in book.orders():
+                    file.write(self._encode(
+                        JournalRecordType.ORDER, book.ticker, order.order_id, order.user_id, '',
+                        order.direction, order.price, order.qty,
+                    ))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        self._open_file()
+
+    def append_order(
+        self,
+        ticker: str,
+        order_id: str,
+        user_id: str,
+        direction: OrderDirection,
+        price: int,
+        qty: int,
+        fills: list[Fill],
+    ):
+        """Заявка вместе с ее исполнениями, одной записью в файл"""
+        self._write([
+            (JournalRecordType.ORDER, ticker, order_id, user_id, '', direction, price, qty),
+            *(
+                (JournalRecordType.FILL, ticker, order_id, '', fill.maker_id, None, fill.maker_price, fill.qty)
+                for fill in fills
+            ),
+        ])
+
+    def append_cancel(self, ticker: str, order_id: str):
+        self._write([(JournalRecordType.CANCEL, ticker, order_id, '', '', None, 0, 0)])
+
+    def flush(self):
+        if self._file is None or not self._unsynced:
+            return
+
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if self._file is None:
+            return
+
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def _open_file(self):
+        # Недописанный хвост после сбоя отрезается, новые записи идут сразу за последней целой
+        reader = JournalReader(self.path)
+        for _ in reader:
+            pass
+
+        self._file = open(self.path, 'r+b' if os.path.exists(self.path) else 'wb', buffering=0)
+        self._file.truncate(reader.end)
+        self._file.seek(reader.end)
+
+    def _write(self, records: list[tuple]):
+        # Журнал открыт только в матчере, в остальных процессах записи не пишутся
+        if self._file is None:
+            return
+
+        data = b''.join(self._encode(*record) for record in records)
+        self._file.write(data)
+        self._unsynced += len(data)
+        if self._unsynced >= self.chunk_size:
+            self.flush()
+
+    def _encode(
+        self,
+        record_type: JournalRecordType,
+        ticker: str,
+        order_id: str,
+        user_id: str,
+        maker_id: str,
+        direction: OrderDirection | None,
+        price: int,
+        qty: int,
+    ) -> bytes:
+        self.seq += 1
+        body = BODY.pack(
+            DIRECTIONS.get(direction, 0),
+            encode_id(order_id),
+            encode_id(user_id),
+            encode_id(maker_id),
+            price,
+            qty,
+        ) + ticker.encode()
+
+        header = HEADER.pack(len(body), self.seq, record_type)
+        return header + body + CRC.pack(zlib.crc32(body, zlib.crc32(header)))
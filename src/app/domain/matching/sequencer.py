@@ -0,0 +1,46 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+
+T = TypeVar('T')
+
+
+class TickerSequencer:
+    """Выполняет операции по одному инструменту строго по очереди, разные инструменты - параллельно"""
+
+    def __init__(self):
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+
+    async def submit(self, ticker: str, operation: Callable[[], Awaitable[T]]) -> T:
+        queue = self._queues.get(ticker)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[ticker] = queue
+            self._workers[ticker] = asyncio.create_task(self._run(queue))
+
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((operation, future))
+        return await future
+
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            operation, future = await queue.get()
+            if future.cancelled():
+                continue
+
+            try:
+                result = await operation()
+            except Exception as exc:
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._queues.clear()
+        self._workers.clear()
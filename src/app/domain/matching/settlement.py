@@ -0,0 +1,45 @@
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+
+@dataclass(slots=True)
+class Settlement:
+    """Суммарные изменения балансов, заявок и сделки по одной транзакции выставления.
+
+    Изменения копятся по ключу (кошелек, инструмент) как (amount, reserved) вместе с
+    резервом под входящие заявки и затем применяются к базе одним запросом.
+    """
+
+    deltas: dict[tuple[int, int], tuple[int, int]] = field(default_factory=dict)
+    filled: dict[uuid.UUID, int] = field(default_factory=dict)
+    transactions: list[dict] = field(default_factory=list)
+    executed_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def _change(self, wallet_id: int, instrument_id: int, amount: int = 0, reserved: int = 0):
+        current_amount, current_reserved = self.deltas.get((wallet_id, instrument_id), (0, 0))
+        self.deltas[(wallet_id, instrument_id)] = (current_amount + amount, current_reserved + reserved)
+
+    def pending(self, wallet_id: int, instrument_id: int) -> tuple[int, int]:
+        return self.deltas.get((wallet_id, instrument_id), (0, 0))
+
+    def reserve(self, wallet_id: int, instrument_id: int, amount: int):
+        self._change(wallet_id, instrument_id, reserved=amount)
+
+    def release(self, wallet_id: int, instrument_id: int, amount: int):
+        self._change(wallet_id, instrument_id, reserved=-amount)
+
+    def transfer(self, from_wallet_id: int, to_wallet_id: int, instrument_id: int, amount: int):
+        self._change(from_wallet_id, instrument_id, amount=-amount)
+        self._change(to_wallet_id, instrument_id, amount=amount)
+
+    def fill(self, order_id: uuid.UUID, qty: int):
+        self.filled[order_id] = self.filled.get(order_id, 0) + qty
+
+    def add_transaction(self, instrument_id: int, wallet_id: int, amount: int, price: int):
+        self.transactions.append({
+            'instrument_id': instrument_id,
+            'wallet_id': wallet_id,
+            'amount': amount,
+            'price': price,
+        })
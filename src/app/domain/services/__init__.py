@@ -1,3 +1,4 @@
+from .candle import CandleService
 from .instrument import InstrumentService
 from .order import OrderService
 from .transaction import TransactionService
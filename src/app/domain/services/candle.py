@@ -0,0 +1,37 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.data.repositories import CandleRepository, InstrumentRepository
+from app.domain.entities import CandleResponse
+from app.domain.enums import CandleInterval
+from app.api.exceptions.exceptions import NotFoundException
+
+
+class CandleService:
+    def __init__(
+        self,
+        session: AsyncSession,
+        candle_repo: CandleRepository,
+        instrument_repo: InstrumentRepository,
+    ):
+        self.session = session
+        self.candle_repo = candle_repo
+        self.instrument_repo = instrument_repo
+
+    async def get_candles(self, ticker: str, interval: CandleInterval, limit: int) -> list[CandleResponse]:
+        instrument = await self.instrument_repo.get_cached_by_ticker(ticker)
+
+        if not instrument:
+            raise NotFoundException(entity_name='Instrument')
+
+        candles = await self.candle_repo.get_candles(instrument_id=instrument.id, interval=interval, limit=limit)
+        return [
+            CandleResponse(
+                timestamp=candle.start,
+                open=candle.open,
+                high=candle.high,
+                low=candle.low,
+                close=candle.close,
+                volume=candle.volume,
+            )
+            for candle in candles
+        ]
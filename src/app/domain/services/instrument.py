@@ -1,7 +1,8 @@
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.data.repositories import InstrumentRepository
+from app.data.cache import InstrumentCache
+from app.data.repositories import CacheInvalidationRepository, InstrumentRepository
 from app.data.models import Instrument
 from app.domain.entities import InstrumentCreate, InstrumentResponse
 from app.api.exceptions.exceptions import NotFoundException
@@ -12,9 +13,11 @@ class InstrumentService:
         self,
         session: AsyncSession,
         instrument_repo: InstrumentRepository,
+        cache_invalidation: CacheInvalidationRepository | None = None,
     ):
         self.session = session
         self.instrument_repo = instrument_repo
+        self.cache_invalidation = cache_invalidation
 
     async def create_instrument(self, instrument: InstrumentCreate) -> InstrumentResponse:
         existing_instrument = await self.instrument_repo.get_instrument_by_ticker(instrument.ticker)
@@ -28,6 +31,7 @@ class InstrumentService:
         response = InstrumentResponse.model_validate(instrument_obj)
 
         await self.session.commit()
+        await self._invalidate_cache()
 
         return response
 
@@ -43,4 +47,10 @@ class InstrumentService:
 
         deleted_instrument = await self.instrument_repo.delete(obj=instrument)
         await self.session.commit()
+        await self._invalidate_cache()
         return deleted_instrument
+
+    async def _invalidate_cache(self):
+        self.instrument_repo.cache.invalidate()
+        if self.cache_invalidation is not None:
+            await self.cache_invalidation.publish(InstrumentCache.NAME)
@@ -1,62 +1,98 @@
+import base64
+import logging
 import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import partial
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
 from app.data.repositories import (
     BalanceRepository,
+    CandleRepository,
     InstrumentRepository,
     OrderBookRepository,
     OrderRepository,
+    TradeOutboxRepository,
     TransactionRepository,
     WalletRepository,
 )
-from app.data.models import Balance, Order, Transaction
+from app.data.cache import OrderBookSnapshot, OrderBookSnapshotCache
+from app.data.models import Balance, Order
 from app.domain.entities import (
+    BatchOrderResponse,
     LimitOrderCreate,
     LimitOrderResponse,
     LevelsResponse,
     MarketOrderCreate,
     MarketOrderResponse,
     OrderBookResponse,
-    SuccessOrderResponse
+    SuccessOrderResponse,
+    TransactionResponse,
 )
-from app.domain.enums import OrderDirection, OrderStatus, OrderType
+from app.domain.enums import MatchingMode, OrderDirection, OrderStatus, OrderType
+from app.domain.matching import BookOrder, Fill, MatchingEngine, MatchingJournal, Settlement
 from app.api.exceptions.exceptions import NotFoundException
 from app.api.exceptions.schemas import SuccessResponse
 
 
+logger = logging.getLogger(__name__)
+
+
 class OrderService:
     def __init__(
         self,
         session: AsyncSession,
         balance_repo: BalanceRepository,
+        candle_repo: CandleRepository,
         instrument_repo: InstrumentRepository,
         order_repo: OrderRepository,
         orderbook: OrderBookRepository,
         transaction_repo: TransactionRepository,
         wallet_repo: WalletRepository,
+        matching_mode: MatchingMode = MatchingMode.REDIS,
+        engine: MatchingEngine | None = None,
+        snapshot_cache: OrderBookSnapshotCache | None = None,
+        journal: MatchingJournal | None = None,
+        trade_outbox: TradeOutboxRepository | None = None,
     ):
         self.session = session
         self.balance_repo = balance_repo
+        self.candle_repo = candle_repo
         self.instrument_repo = instrument_repo
         self.order_repo = order_repo
         self.orderbook = orderbook
         self.transaction_repo = transaction_repo
         self.wallet_repo = wallet_repo
-
-    async def list_orders(self, user_id: uuid.UUID) -> list[LimitOrderResponse | MarketOrderResponse]:
-        user_orders = await self.order_repo.get_user_orders(user_id=user_id)
-
-        result_orders = []
-        for order in user_orders:
-            if order.order_type == OrderType.LIMIT:
-                limit_order = await self._get_limit_order_response(order)
-                result_orders.append(limit_order)
-            else:
-                limit_order = await self._get_market_order_response(order)
-                result_orders.append(limit_order)
-        
-        return result_orders
+        self.matching_mode = matching_mode
+        self.engine = engine
+        self.snapshot_cache = snapshot_cache
+        self.journal = journal
+        self.trade_outbox = trade_outbox
+        # Сервис живет один запрос, поэтому кошельки пользователей можно запоминать
+        self._wallet_ids: dict[uuid.UUID, int] = {}
+        # Записи журнала копятся до коммита, чтобы откаченные заявки в него не попали
+        self._journal_entries: list[partial] = []
+        # Стаканы меняются до коммита, здесь копятся шаги, которые вернут их при откате
+        self._orderbook_undo: list[partial] = []
+
+    async def list_orders(
+        self,
+        user_id: uuid.UUID,
+        after: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[LimitOrderResponse | MarketOrderResponse], str | None]:
+        """Активные заявки одним запросом вместе с тикерами и курсор следующей страницы.
+        Курсор непрозрачный, None - страница последняя или размер страницы не задан"""
+        cursor = self._parse_order_cursor(after) if after else None
+        user_orders = await self.order_repo.get_user_orders(user_id=user_id, after=cursor, limit=limit)
+
+        next_cursor = None
+        if limit is not None and len(user_orders) == limit:
+            last_order, _ = user_orders[-1]
+            next_cursor = self._make_order_cursor(last_order)
+
+        return [self._get_order_response(order, ticker) for order, ticker in user_orders], next_cursor
 
     async def get_order_by_id(self, user_id: uuid.UUID, order_id: uuid.UUID) -> LimitOrderResponse | MarketOrderResponse:
         user_order = await self.order_repo.get_by_id(order_id)
@@ -64,28 +100,69 @@ class OrderService:
         if user_order.user_id != user_id:
             raise HTTPException(status_code=403, detail="Can't get other user's order")
 
-        if user_order.order_type == OrderType.LIMIT:
-            return await self._get_limit_order_response(user_order)
-        else:
-            return await self._get_market_order_response(user_order)
+        instrument = await self.instrument_repo.get_cached_by_id(user_order.instrument_id)
+        return self._get_order_response(user_order, instrument.ticker)
+
+    async def get_order_ticker(self, order_id: uuid.UUID) -> str:
+        async with self.session.begin():
+            order = await self.order_repo.get_by_id(order_id)
+            if not order:
+                raise HTTPException(status_code=404, detail="Order not found")
+
+            instrument = await self.instrument_repo.get_cached_by_id(order.instrument_id)
+            return instrument.ticker
 
     async def get_orderbook(self, ticker: str, limit: int) -> OrderBookResponse:
-        buy_orders = await self.orderbook.get_price_levels(ticker, OrderDirection.BUY, limit)
-        sell_orders = await self.orderbook.get_price_levels(ticker, OrderDirection.SELL, limit)
-        
-        bid_levels = []
-        ask_levels = []
-        
-        for price, qty in sorted(buy_orders.items(), reverse=True):
-            bid_levels.append(LevelsResponse(price=price, qty=qty))
-        
-        for price, qty in sorted(sell_orders.items()):
-            ask_levels.append(LevelsResponse(price=price, qty=qty))
-        
-        return OrderBookResponse(bid_levels=bid_levels, ask_levels=ask_levels)
-
-    async def _get_limit_order_response(self, order: Order) -> LimitOrderResponse:
-        instrument = await self.instrument_repo.get_by_id(order.instrument_id)
+        orderbook, _ = await self.get_versioned_orderbook(ticker, limit)
+        return orderbook
+
+    async def get_versioned_orderbook(self, ticker: str, limit: int) -> tuple[OrderBookResponse, int]:
+        buy_levels, sell_levels, version = await self.orderbook.get_depth(ticker, limit)
+
+        bid_levels = [LevelsResponse(price=price, qty=qty) for price, qty in buy_levels]
+        ask_levels = [LevelsResponse(price=price, qty=qty) for price, qty in sell_levels]
+
+        return OrderBookResponse(bid_levels=bid_levels, ask_levels=ask_levels), version
+
+    async def get_orderbook_snapshot(self, ticker: str, limit: int) -> OrderBookSnapshot:
+        """Сериализованный стакан с версией. Пересобирается только при изменении стакана
+        или после пересборки стаканов в Redis"""
+        snapshot = self.snapshot_cache.get(ticker, limit)
+        if snapshot is not None:
+            if self.snapshot_cache.is_fresh(snapshot):
+                return snapshot
+
+            epoch, version = await self.orderbook.get_versions(ticker)
+            if (snapshot.epoch, snapshot.version) == (epoch, version):
+                self.snapshot_cache.touch(snapshot)
+                return snapshot
+        else:
+            epoch = await self.orderbook.get_rebuilt()
+
+        # Метка читается до стакана: снимок, собранный во время пересборки, не совпадет с новыми
+        orderbook, version = await self.get_versioned_orderbook(ticker, limit)
+        return self.snapshot_cache.put(ticker, limit, epoch, version, orderbook.model_dump_json().encode())
+
+    @staticmethod
+    def _make_order_cursor(order: Order) -> str:
+        # (timestamp, id) последней заявки страницы, в base64, чтобы курсор не портился в query string
+        return base64.urlsafe_b64encode(f'{order.timestamp.isoformat()},{order.id}'.encode()).decode()
+
+    @staticmethod
+    def _parse_order_cursor(after: str) -> tuple[datetime, uuid.UUID]:
+        try:
+            timestamp, order_id = base64.urlsafe_b64decode(after.encode()).decode().split(',')
+            return datetime.fromisoformat(timestamp), uuid.UUID(order_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def _get_order_response(self, order: Order, ticker: str) -> LimitOrderResponse | MarketOrderResponse:
+        if order.order_type == OrderType.LIMIT:
+            return self._get_limit_order_response(order, ticker)
+        else:
+            return self._get_market_order_response(order, ticker)
+
+    def _get_limit_order_response(self, order: Order, ticker: str) -> LimitOrderResponse:
         return LimitOrderResponse(
             id=order.id,
             status=order.status,
@@ -93,15 +170,14 @@ class OrderService:
             timestamp=order.timestamp,
             body=LimitOrderCreate(
                 direction=order.direction,
-                ticker=instrument.ticker,
+                ticker=ticker,
                 qty=order.qty,
                 price=order.price
             ),
             filled=order.filled
         )
 
-    async def _get_market_order_response(self, order: Order) -> MarketOrderResponse:
-        instrument = await self.instrument_repo.get_by_id(order.instrument_id)
+    def _get_market_order_response(self, order: Order, ticker: str) -> MarketOrderResponse:
         return MarketOrderResponse(
             id=order.id,
             status=order.status,
@@ -109,53 +185,37 @@ class OrderService:
             timestamp=order.timestamp,
             body=MarketOrderCreate(
                 direction=order.direction,
-                ticker=instrument.ticker,
+                ticker=ticker,
                 qty=order.qty
             )
         )
 
     async def create_order(self, user_id: uuid.UUID, order: LimitOrderCreate | MarketOrderCreate) -> SuccessOrderResponse:
-        async with self.session.begin():
-            instrument = await self.instrument_repo.get_instrument_by_ticker(ticker=order.ticker)
+        async with self._transaction():
+            instrument = await self.instrument_repo.get_cached_by_ticker(order.ticker)
             if not instrument:
                 raise HTTPException(status_code=404, detail="Instrument not found")
 
-            wallet = await self.wallet_repo.get_wallet_by_user_id(user_id=user_id)
-            if not wallet:
+            wallet_id = await self._get_wallet_id(user_id)
+            if not wallet_id:
                 raise HTTPException(status_code=404, detail="Wallet not found")
 
-            rub_instrument = await self.instrument_repo.get_instrument_by_ticker(ticker="RUB")
+            rub_instrument = await self.instrument_repo.get_cached_by_ticker("RUB")
             if not rub_instrument:
                 raise HTTPException(status_code=404, detail="RUB instrument not configured")
 
-            if isinstance(order, LimitOrderCreate):
-                if order.direction == OrderDirection.BUY:
-                    required_amount = order.qty * order.price
-
-                    balance = await self.balance_repo.get_user_balance_of_instrument(wallet.id, rub_instrument.id)
-                    if not balance or balance.amount < required_amount:
-                        raise HTTPException(status_code=400, detail="Insufficient RUB quantity")
+            # Остаток проверяется по чтению без блокировки: уменьшить его параллельно может
+            # только другая транзакция того же кошелька, а она ждет этой блокировки
+            await self.balance_repo.lock_wallet(wallet_id)
+            balances = await self.balance_repo.get_balances([
+                (wallet_id, instrument.id),
+                (wallet_id, rub_instrument.id),
+            ])
 
-                    await self._reserve_funds(wallet.id, rub_instrument.id, required_amount)
-                else:
-                    balance = await self.balance_repo.get_user_balance_of_instrument(wallet.id, instrument.id)
-                    if not balance or balance.amount < order.qty:
-                        raise HTTPException(status_code=400, detail="Insufficient instrument quantity")
-
-                    await self._reserve_funds(wallet.id, instrument.id, order.qty)
-            else:
-                if order.direction == OrderDirection.BUY:
-                    total_cost = await self._calculate_market_buy_cost(order.ticker, order.qty)
-                    if total_cost is None:
-                        raise HTTPException(status_code=400, detail="Not enough liquidity for market order")
-
-                    balance = await self.balance_repo.get_user_balance_of_instrument(wallet.id, rub_instrument.id)
-                    if not balance or balance.amount < total_cost:
-                        raise HTTPException(status_code=400, detail="Insufficient RUB quantity")
-                else:
-                    balance = await self.balance_repo.get_user_balance_of_instrument(wallet.id, instrument.id)
-                    if not balance or balance.amount < order.qty:
-                        raise HTTPException(status_code=400, detail="Insufficient instrument quantity")
+            settlement = Settlement()
+            detail = await self._check_funds(order, wallet_id, instrument.id, rub_instrument.id, balances, settlement)
+            if detail:
+                raise HTTPException(status_code=400, detail=detail)
 
             order_obj = Order(
                 user_id=user_id,
@@ -169,224 +229,414 @@ class OrderService:
             )
             await self.order_repo.add(order_obj)
 
-            if isinstance(order, LimitOrderCreate):
-                await self.orderbook.add_order(
-                    order_id=str(order_obj.id),
-                    ticker=order.ticker,
+            trades = await self._try_execute_order(order=order_obj, ticker=order.ticker, settlement=settlement)
+            await self._apply_settlement(settlement)
+            response = SuccessOrderResponse(order_id=order_obj.id)
+
+        # Сделки публикуются только после коммита, чтобы подписчики не увидели откаченных
+        self._write_journal()
+        await self.orderbook.publish_trades(order.ticker, trades)
+
+        return response
+
+    async def create_orders(
+        self,
+        user_id: uuid.UUID,
+        orders: list[LimitOrderCreate | MarketOrderCreate],
+    ) -> list[BatchOrderResponse]:
+        """Пакетное выставление заявок одной транзакцией.
+
+        Инструменты, кошелек и балансы определяются один раз на пакет, изменения
+        балансов по всем заявкам применяются в конце одним обновлением. Заявки, не
+        прошедшие проверку, отклоняются по отдельности и не мешают остальным.
+        """
+        trades: dict[str, list[dict]] = {}
+
+        async with self._transaction():
+            wallet_id = await self._get_wallet_id(user_id)
+            if not wallet_id:
+                raise HTTPException(status_code=404, detail="Wallet not found")
+
+            instruments = {}
+            for ticker in {order.ticker for order in orders} | {"RUB"}:
+                instrument = await self.instrument_repo.get_cached_by_ticker(ticker)
+                if instrument:
+                    instruments[ticker] = instrument
+            rub_instrument = instruments.get("RUB")
+            if not rub_instrument:
+                raise HTTPException(status_code=404, detail="RUB instrument not configured")
+
+            await self.balance_repo.lock_wallet(wallet_id)
+            balances = await self.balance_repo.get_balances([
+                (wallet_id, instrument.id) for instrument in instruments.values()
+            ])
+
+            # Каждая заявка проверяется по остатку с учетом резервов и сделок предыдущих
+            settlement = Settlement()
+            results: list[BatchOrderResponse | None] = [None] * len(orders)
+            for index, order in enumerate(orders):
+                instrument = instruments.get(order.ticker)
+                if not instrument:
+                    results[index] = BatchOrderResponse(success=False, detail="Instrument not found")
+                    continue
+
+                detail = await self._check_funds(order, wallet_id, instrument.id, rub_instrument.id, balances, settlement)
+                if detail:
+                    results[index] = BatchOrderResponse(success=False, detail=detail)
+                    continue
+
+                order_obj = Order(
+                    user_id=user_id,
+                    instrument_id=instrument.id,
+                    order_type=OrderType.LIMIT if isinstance(order, LimitOrderCreate) else OrderType.MARKET,
+                    status=OrderStatus.NEW,
                     direction=order.direction,
-                    price=order.price,
                     qty=order.qty,
-                    user_id=str(user_id),
+                    price=order.price if isinstance(order, LimitOrderCreate) else 0,
+                    filled=0
                 )
+                await self.order_repo.add(order_obj)
 
-                await self._try_execute_order(
-                    order_id=str(order_obj.id),
-                    ticker=order.ticker,
-                    direction=order.direction,
-                    price=order.price,
-                    order_type=OrderType.LIMIT
-                )
-            else:
-                await self._try_execute_order(
-                    order_id=str(order_obj.id),
-                    ticker=order.ticker,
-                    direction=order.direction,
-                    price=0,
-                    order_type=OrderType.MARKET
-                )
+                order_trades = await self._try_execute_order(order=order_obj, ticker=order.ticker, settlement=settlement)
+                trades.setdefault(order.ticker, []).extend(order_trades)
+                results[index] = BatchOrderResponse(order_id=order_obj.id)
 
-            return SuccessOrderResponse(order_id=order_obj.id)
+            await self._apply_settlement(settlement)
+
+        self._write_journal()
+        for ticker, ticker_trades in trades.items():
+            await self.orderbook.publish_trades(ticker, ticker_trades)
+
+        return results
 
     async def _calculate_market_buy_cost(self, ticker: str, qty: int) -> int | None:
+        if self.matching_mode != MatchingMode.MEMORY:
+            return await self.orderbook.get_market_cost(ticker, OrderDirection.BUY, qty)
+
         total_cost = 0
         remaining_qty = qty
-        
-        sell_orders = await self.orderbook.find_matches(ticker, OrderDirection.BUY, 0)
-        
-        for order_id, order_price in sell_orders:
+
+        book = await self.engine.get_book(ticker, self.orderbook)
+        for level_price, level_qty in book.asks.levels():
             if remaining_qty <= 0:
                 break
-
-            order = await self.orderbook.get_order_data(order_id)
-            
-            available_qty = int(order['qty']) - int(order['filled'])
-            fill_qty = min(available_qty, remaining_qty)
-            total_cost += fill_qty * order_price
+            fill_qty = min(level_qty, remaining_qty)
+            total_cost += fill_qty * level_price
             remaining_qty -= fill_qty
-        
+
         return total_cost if remaining_qty == 0 else None
 
-    async def _reserve_funds(self, wallet_id: int, instrument_id: int, amount: int):
-        balance = await self.balance_repo.get_user_balance_of_instrument(wallet_id, instrument_id)
-        if not balance or balance.amount < amount:
-            raise HTTPException(status_code=400, detail="Insufficient funds")
+    async def _check_funds(
+        self,
+        order: LimitOrderCreate | MarketOrderCreate,
+        wallet_id: int,
+        instrument_id: int,
+        rub_instrument_id: int,
+        balances: dict[tuple[int, int], Balance],
+        settlement: Settlement,
+    ) -> str | None:
+        """Проверяет свободный остаток под заявку и ставит в settlement резерв лимитной.
+        Возвращает причину отказа"""
+        rub_balance = balances.get((wallet_id, rub_instrument_id))
+        instrument_balance = balances.get((wallet_id, instrument_id))
+
+        if isinstance(order, LimitOrderCreate):
+            if order.direction == OrderDirection.BUY:
+                if self._available(rub_balance, settlement) < order.qty * order.price:
+                    return "Insufficient RUB quantity"
+                settlement.reserve(wallet_id, rub_instrument_id, order.qty * order.price)
+            else:
+                if self._available(instrument_balance, settlement) < order.qty:
+                    return "Insufficient instrument quantity"
+                settlement.reserve(wallet_id, instrument_id, order.qty)
+        elif order.direction == OrderDirection.BUY:
+            total_cost = await self._calculate_market_buy_cost(order.ticker, order.qty)
+            if total_cost is None:
+                return "Not enough liquidity for market order"
+            if self._available(rub_balance, settlement) < total_cost:
+                return "Insufficient RUB quantity"
+        elif self._available(instrument_balance, settlement) < order.qty:
+            return "Insufficient instrument quantity"
+
+        return None
+
+    @staticmethod
+    def _available(balance: Balance | None, settlement: Settlement) -> int:
+        """Свободный остаток вместе с еще не примененными изменениями транзакции"""
+        if not balance:
+            return 0
 
-        await self.balance_repo.reserve(wallet_id, instrument_id, amount)
+        amount, reserved = settlement.pending(balance.wallet_id, balance.instrument_id)
+        return balance.amount + amount - balance.reserved - reserved
+
+    async def _get_wallet_id(self, user_id: uuid.UUID) -> int | None:
+        wallet_ids = await self._get_wallet_ids({user_id})
+        return wallet_ids.get(user_id)
+
+    async def _get_wallet_ids(self, user_ids: set[uuid.UUID]) -> dict[uuid.UUID, int]:
+        """Id кошельков без загрузки балансов, недостающие добираются одним запросом"""
+        missing = [user_id for user_id in user_ids if user_id not in self._wallet_ids]
+        if missing:
+            self._wallet_ids.update(await self.wallet_repo.get_wallet_ids_by_user_ids(missing))
+        return {user_id: self._wallet_ids[user_id] for user_id in user_ids if user_id in self._wallet_ids}
+
+    @asynccontextmanager
+    async def _transaction(self):
+        """Транзакция с матчингом. Если она откатилась, изменения стаканов отменяются
+        в обратном порядке, чтобы в них не остались сделки, которых нет в Postgres, а записи
+        журнала отбрасываются: сервис может выполнять следующие транзакции"""
+        try:
+            async with self.session.begin():
+                yield
+        except BaseException:
+            self._journal_entries.clear()
+            await self._undo_orderbook()
+            raise
+        self._orderbook_undo.clear()
+
+    async def _undo_orderbook(self):
+        undo, self._orderbook_undo = self._orderbook_undo, []
+        for step in reversed(undo):
+            try:
+                await step()
+            except Exception:
+                logger.exception('Failed to restore orderbook after rollback, rebuild it from Postgres')
+
+    def _undo_fill(self, ticker: str, direction: OrderDirection, fill: Fill, member: str):
+        """Запоминает, как вернуть в Redis объем исполнения встречной заявки стороны direction"""
+        if member:
+            self._orderbook_undo.append(partial(
+                self.orderbook.restore_order,
+                ticker, direction, fill.maker_id, member, fill.maker_price, fill.qty, fill.maker_user_id,
+            ))
+
+    def _write_journal(self):
+        entries, self._journal_entries = self._journal_entries, []
+        for append in entries:
+            append()
 
     async def _release_funds(self, wallet_id: int, instrument_id: int, amount: int):
         await self.balance_repo.release(wallet_id, instrument_id, amount)
 
-    async def _transfer_funds(self, from_wallet_id: int, to_wallet_id: int, 
-                            instrument_id: int, amount: int):
-        await self.balance_repo.transfer(
-            from_wallet_id, to_wallet_id, instrument_id, amount
+    async def _try_execute_order(self, order: Order, ticker: str, settlement: Settlement) -> list[dict]:
+        if self.matching_mode == MatchingMode.SCRIPT:
+            fills = await self._match_order_atomic(order=order, ticker=ticker)
+        else:
+            fills = await self._match_order(
+                ticker=ticker,
+                direction=order.direction,
+                price=order.price,
+                qty=order.qty,
+            )
+
+            remaining_qty = order.qty - sum(fill.qty for fill in fills)
+            if order.order_type == OrderType.LIMIT and remaining_qty > 0:
+                await self._add_to_orderbook(order=order, ticker=ticker, qty=remaining_qty)
+
+        if self.journal is not None:
+            self._journal_entries.append(partial(
+                self.journal.append_order,
+                ticker, str(order.id), str(order.user_id), order.direction, order.price, order.qty, fills,
+            ))
+
+        return await self._settle(order=order, ticker=ticker, fills=fills, settlement=settlement)
+
+    async def _add_to_orderbook(self, order: Order, ticker: str, qty: int):
+        await self.orderbook.add_order(
+            order_id=str(order.id),
+            ticker=ticker,
+            direction=order.direction,
+            price=order.price,
+            qty=qty,
+            user_id=str(order.user_id),
+        )
+        self._orderbook_undo.append(partial(self.orderbook.remove_order, ticker, order.direction, str(order.id)))
+
+        if self.matching_mode == MatchingMode.MEMORY:
+            await self.engine.add_order(self.orderbook, ticker, BookOrder(
+                order_id=str(order.id),
+                user_id=str(order.user_id),
+                direction=order.direction,
+                price=order.price,
+                qty=qty,
+            ))
+            self._orderbook_undo.append(partial(self.engine.cancel_order, self.orderbook, ticker, str(order.id)))
+
+    async def _match_order_atomic(self, order: Order, ticker: str) -> list[Fill]:
+        """Матчинг и постановка остатка лимитной заявки в стакан одним скриптом в Redis"""
+        result = await self.orderbook.match_order(
+            ticker=ticker,
+            direction=order.direction,
+            price=order.price,
+            qty=order.qty,
+            order_id=str(order.id) if order.order_type == OrderType.LIMIT else '',
+            user_id=str(order.user_id),
         )
 
-    async def _try_execute_order(
-        self, 
-        order_id: str, 
-        ticker: str, 
-        direction: OrderDirection, 
+        opposite_dir = OrderDirection.SELL if order.direction == OrderDirection.BUY else OrderDirection.BUY
+        fills = []
+        for maker_id, maker_user_id, maker_price, fill_qty, maker_remaining, member in result:
+            fill = Fill(
+                maker_id=maker_id,
+                maker_user_id=maker_user_id,
+                maker_price=maker_price,
+                qty=fill_qty,
+                maker_remaining=maker_remaining,
+            )
+            self._undo_fill(ticker, opposite_dir, fill, member)
+            fills.append(fill)
+
+        if order.order_type == OrderType.LIMIT and order.qty > sum(fill.qty for fill in fills):
+            self._orderbook_undo.append(partial(self.orderbook.remove_order, ticker, order.direction, str(order.id)))
+        return fills
+
+    async def _match_order(
+        self,
+        ticker: str,
+        direction: OrderDirection,
         price: int,
-        order_type: OrderType
-    ):
-        if order_type == OrderType.LIMIT:
-            order_data = await self.orderbook.get_order_data(order_id)
-            remaining_qty = int(order_data['qty']) - int(order_data['filled'])
-        else:
-            order = await self.order_repo.get_by_id(order_id)
-            remaining_qty = order.qty - order.filled
+        qty: int,
+    ) -> list[Fill]:
+        """Сводит заявку со стаканом и возвращает список исполнений. price == 0 - рыночная заявка"""
+        opposite_dir = OrderDirection.SELL if direction == OrderDirection.BUY else OrderDirection.BUY
+        if self.matching_mode == MatchingMode.MEMORY:
+            fills = await self.engine.match(self.orderbook, ticker, direction, price, qty)
+            self._orderbook_undo.append(partial(self.engine.revert_fills, self.orderbook, ticker, opposite_dir, fills))
+            members = await self.orderbook.apply_fills(
+                ticker,
+                opposite_dir,
+                [(fill.maker_id, fill.qty, fill.maker_remaining) for fill in fills]
+            )
+            for fill, member in zip(fills, members):
+                self._undo_fill(ticker, opposite_dir, fill, member)
+            return fills
 
+        fills = []
+        remaining_qty = qty
         while remaining_qty > 0:
             matches = await self.orderbook.find_matches(ticker, direction, float(price))
             
             if not matches:
                 break
 
-            for match_id, match_price in matches:
-                match_price = min(match_price, price)
+            matched = False
+            for match_id, _ in matches:
                 if remaining_qty <= 0:
                     break
-            
-                executed_qty = await self._execute_trade(
-                    order_id=order_id,
-                    match_id=match_id,
-                    ticker=ticker,
-                    price=match_price,
-                    order_type=order_type,
-                    max_qty=remaining_qty
-                )
 
-                remaining_qty -= executed_qty
-
-    async def _execute_trade(
-        self,
-        order_id: str,
-        match_id: str,
-        ticker: str,
-        price: int,
-        order_type: OrderType,
-        max_qty: int,
-    ) -> int:
-        if order_type == OrderType.LIMIT:
-            order_data = await self.orderbook.get_order_data(order_id)
-            order_qty = int(order_data['qty'])
-            order_filled = int(order_data['filled'])
-            order_direction = order_data['direction']
-            order_status = order_data['status']
-            order_price = int(order_data['price'])
-            order_user_id = order_data['user_id']
-        else:
-            order_data = await self.order_repo.get_by_id(order_id)
-            order_qty = order_data.qty
-            order_filled = order_data.filled
-            order_direction = order_data.direction
-            order_status = order_data.status
-            order_price = order_data.price
-            order_user_id = order_data.user_id
-
-        match_data = await self.orderbook.get_order_data(match_id)
-        match_qty = int(match_data['qty'])
-        match_filled = int(match_data['filled'])
-        match_direction = match_data['direction']
-        match_price = int(match_data['price'])
-        match_user_id = match_data['user_id']
-        
-        if not order_data or not match_data or order_status not in [OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED]:
-            return False
-
-        order_remaining = order_qty - order_filled
-        match_remaining = match_qty - match_filled
-        fill_qty = min(order_remaining, match_remaining)
-        
-        if fill_qty <= 0:
-            return 0
-
-        instrument = await self.instrument_repo.get_instrument_by_ticker(ticker)
-        rub_instrument = await self.instrument_repo.get_instrument_by_ticker("RUB")
-        
-        order_wallet = await self.wallet_repo.get_wallet_by_user_id(order_user_id)
-        match_wallet = await self.wallet_repo.get_wallet_by_user_id(match_user_id)
-
-        if order_type == OrderType.LIMIT:
-            if order_direction == OrderDirection.BUY:
-                await self.balance_repo.release(
-                    order_wallet.id, 
-                    rub_instrument.id,
-                    fill_qty * order_price
+                match_data = await self.orderbook.get_order_data(ticker, match_id)
+                if not match_data:
+                    continue
+
+                match_remaining = int(match_data['qty']) - int(match_data['filled'])
+                fill_qty = min(match_remaining, remaining_qty)
+                if fill_qty <= 0:
+                    continue
+
+                fill = Fill(
+                    maker_id=match_id,
+                    maker_user_id=match_data['user_id'],
+                    maker_price=int(match_data['price']),
+                    qty=fill_qty,
+                    maker_remaining=match_remaining - fill_qty,
                 )
-            else:
-                await self.balance_repo.release(
-                    order_wallet.id,
-                    instrument.id,
-                    fill_qty
-                )
-
-        if match_direction == OrderDirection.BUY:
-            buyer_wallet = match_wallet
-            seller_wallet = order_wallet
+                await self.orderbook.update_order_fill(ticker, opposite_dir, match_id, fill_qty)
+                self._undo_fill(ticker, opposite_dir, fill, match_data.get('member', ''))
+                if fill_qty == match_remaining:
+                    await self.orderbook.remove_order(ticker, opposite_dir, match_id)
+                else:
+                    await self.orderbook.update_order_status(ticker, match_id, OrderStatus.PARTIALLY_EXECUTED)
 
-            await self.balance_repo.release(
-                match_wallet.id,
-                rub_instrument.id,
-                fill_qty * match_price
-            )
-        else:
-            buyer_wallet = order_wallet
-            seller_wallet = match_wallet
+                fills.append(fill)
+                remaining_qty -= fill_qty
+                matched = True
 
-            await self.balance_repo.release(
-                match_wallet.id,
-                instrument.id,
-                fill_qty
-            )
+            if not matched:
+                break
 
-        await self._transfer_funds(
-            seller_wallet.id, buyer_wallet.id, instrument.id, fill_qty)
+        return fills
 
-        rub_amount = fill_qty * price
-        await self._transfer_funds(
-            buyer_wallet.id, seller_wallet.id, rub_instrument.id, rub_amount)
+    async def _settle(self, order: Order, ticker: str, fills: list[Fill], settlement: Settlement) -> list[dict]:
+        """Расчеты по всем исполнениям заявки: изменения балансов, заявок и сделки копятся
+        в settlement и применяются в конце транзакции. Возвращает сделки для публикации"""
+        if not fills:
+            return []
 
-        transaction_obj = Transaction(
-            instrument_id=instrument.id,
-            wallet_id=seller_wallet.id,
-            amount=fill_qty,
-            price=price,
-        )
-        await self.transaction_repo.add(transaction_obj)
+        instrument = await self.instrument_repo.get_cached_by_ticker(ticker)
+        rub_instrument = await self.instrument_repo.get_cached_by_ticker("RUB")
 
-        await self._update_order_fills(order_id, order_type, match_id, fill_qty)
+        wallet_ids = await self._get_wallet_ids({order.user_id, *(uuid.UUID(fill.maker_user_id) for fill in fills)})
+        order_wallet_id = wallet_ids[order.user_id]
 
-        return fill_qty
+        trades = []
+        for fill in fills:
+            # Рыночная заявка исполняется по цене встречной заявки
+            price = min(fill.maker_price, order.price) if order.price else fill.maker_price
+            fill_qty = fill.qty
+            match_wallet_id = wallet_ids[uuid.UUID(fill.maker_user_id)]
 
-    async def _update_order_fills(self, order_id: uuid.UUID, order_type: OrderType, match_id: str, fill_qty: int):
-        order_status = await self.order_repo.update_filled(order_id=order_id, fill_qty=fill_qty)
-        match_status = await self.order_repo.update_filled(order_id=match_id, fill_qty=fill_qty)
-        
-        if order_type == OrderType.LIMIT:
-            await self.orderbook.update_order_fill(order_id, fill_qty)
-            await self.orderbook.update_order_status(order_id, order_status)
-            if order_status == OrderStatus.EXECUTED:
-                await self.orderbook.remove_order(order_id)
+            if order.order_type == OrderType.LIMIT:
+                if order.direction == OrderDirection.BUY:
+                    settlement.release(order_wallet_id, rub_instrument.id, fill_qty * order.price)
+                else:
+                    settlement.release(order_wallet_id, instrument.id, fill_qty)
 
-        await self.orderbook.update_order_fill(match_id, fill_qty)
-        await self.orderbook.update_order_status(match_id, match_status)
-        if match_status == OrderStatus.EXECUTED:
-            await self.orderbook.remove_order(match_id)
+            if order.direction == OrderDirection.SELL:
+                buyer_wallet_id = match_wallet_id
+                seller_wallet_id = order_wallet_id
+                settlement.release(match_wallet_id, rub_instrument.id, fill_qty * fill.maker_price)
+            else:
+                buyer_wallet_id = order_wallet_id
+                seller_wallet_id = match_wallet_id
+                settlement.release(match_wallet_id, instrument.id, fill_qty)
+
+            settlement.transfer(seller_wallet_id, buyer_wallet_id, instrument.id, fill_qty)
+            settlement.transfer(buyer_wallet_id, seller_wallet_id, rub_instrument.id, fill_qty * price)
+            settlement.add_transaction(instrument.id, seller_wallet_id, fill_qty, price)
+            settlement.fill(uuid.UUID(fill.maker_id), fill_qty)
+
+            trades.append(TransactionResponse(
+                ticker=ticker,
+                amount=fill_qty,
+                price=price,
+                timestamp=settlement.executed_at,
+            ).model_dump(mode='json'))
+
+        settlement.fill(order.id, sum(fill.qty for fill in fills))
+        return trades
+
+    async def _apply_settlement(self, settlement: Settlement):
+        """Применяет накопленные изменения. Балансы всех участников, включая резерв входящих
+        заявок, блокируются одним запросом в порядке id до первой записи в них, поэтому
+        параллельные расчеты по любым инструментам не взаимоблокируются"""
+        await self.balance_repo.lock_balances(list(settlement.deltas))
+        await self.balance_repo.apply_deltas(settlement.deltas)
+
+        for order_id in sorted(settlement.filled):
+            await self.order_repo.update_filled(order_id=order_id, fill_qty=settlement.filled[order_id])
+
+        if not settlement.transactions:
+            return
+
+        if self.trade_outbox is not None:
+            # Сделки и свечи запишет trade_writer, в запросе остаются матчинг, балансы и одна строка outbox
+            await self.trade_outbox.add_trades(settlement.executed_at, settlement.transactions)
+        else:
+            # Время сделок то же, что в outbox и в опубликованных сделках
+            await self.transaction_repo.add_many([
+                {**transaction, 'timestamp': settlement.executed_at} for transaction in settlement.transactions
+            ])
+            # Свечи тоже обновляются в одном порядке инструментов
+            candle_trades: dict[int, list[tuple[int, int]]] = {}
+            for transaction in settlement.transactions:
+                candle_trades.setdefault(transaction['instrument_id'], []).append(
+                    (transaction['price'], transaction['amount'])
+                )
+            for instrument_id in sorted(candle_trades):
+                await self.candle_repo.add_trades(instrument_id, candle_trades[instrument_id], settlement.executed_at)
 
     async def cancel_order(self, order_id: uuid.UUID, user_id: uuid.UUID) -> SuccessResponse:
-        async with self.session.begin():
+        async with self._transaction():
             order = await self.order_repo.get_by_id(order_id)
             if not order:
                 raise HTTPException(status_code=404, detail="Order not found")
@@ -400,18 +650,26 @@ class OrderService:
             if order.status not in [OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED]:
                 raise HTTPException(status_code=400, detail="Can't cancel executed or cancelled order")
 
-            wallet = await self.wallet_repo.get_wallet_by_user_id(user_id)
+            wallet_id = await self._get_wallet_id(user_id)
             if order.direction == OrderDirection.BUY:
-                rub_instrument = await self.instrument_repo.get_instrument_by_ticker("RUB")
+                rub_instrument = await self.instrument_repo.get_cached_by_ticker("RUB")
                 reserved_amount = (order.qty - order.filled) * order.price
-                await self._release_funds(wallet.id, rub_instrument.id, reserved_amount)
+                await self._release_funds(wallet_id, rub_instrument.id, reserved_amount)
             else:
                 reserved_amount = order.qty - order.filled
-                await self._release_funds(wallet.id, order.instrument_id, reserved_amount)
+                await self._release_funds(wallet_id, order.instrument_id, reserved_amount)
 
             await self.order_repo.update_status(order_id=order_id, status=OrderStatus.CANCELLED)
             
             if order.order_type == OrderType.LIMIT:
-                await self.orderbook.remove_order(str(order_id))
+                instrument = await self.instrument_repo.get_cached_by_id(order.instrument_id)
+                await self.orderbook.remove_order(instrument.ticker, OrderDirection(order.direction), str(order_id))
+
+                if self.matching_mode == MatchingMode.MEMORY:
+                    await self.engine.cancel_order(self.orderbook, instrument.ticker, str(order_id))
+
+                if self.journal is not None:
+                    self._journal_entries.append(partial(self.journal.append_cancel, instrument.ticker, str(order_id)))
 
-            return SuccessResponse()
+        self._write_journal()
+        return SuccessResponse()
@@ -1,8 +1,14 @@
+import csv
+import io
 import uuid
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.data.repositories import InstrumentRepository, TransactionRepository
 from app.data.models import Instrument
+from app.domain.entities import TransactionHistoryResponse
+from app.domain.enums import ExportFormat
 from app.api.exceptions.exceptions import NotFoundException
 
 
@@ -12,16 +18,69 @@ class TransactionService:
         session: AsyncSession,
         instrument_repo: InstrumentRepository,
         transaction_repo: TransactionRepository,
+        session_factory: async_sessionmaker[AsyncSession] | None = None,
     ):
         self.session = session
         self.instrument_repo = instrument_repo
         self.transaction_repo = transaction_repo
+        self.session_factory = session_factory
 
-    async def get_transactions(self, ticker: str, limit: int):
-        instrument = await self.instrument_repo.get_instrument_by_ticker(ticker=ticker)
+    async def get_transactions(self, ticker: str, limit: int, before_id: int | None = None) -> list[TransactionHistoryResponse]:
+        instrument = await self.instrument_repo.get_cached_by_ticker(ticker)
 
         if not instrument:
             raise NotFoundException(entity_name='Instrument')
 
-        transactions = await self.transaction_repo.get_all_transactions_by_instrument(instrument_id=instrument.id, limit=limit)
-        return transactions
+        transactions = await self.transaction_repo.get_all_transactions_by_instrument(
+            instrument_id=instrument.id,
+            limit=limit,
+            before_id=before_id,
+        )
+        return [
+            TransactionHistoryResponse(
+                id=transaction.id,
+                ticker=ticker,
+                amount=transaction.amount,
+                price=transaction.price,
+                timestamp=transaction.timestamp,
+            )
+            for transaction in transactions
+        ]
+
+    async def export_transactions(self, ticker: str, export_format: ExportFormat) -> AsyncIterator[bytes]:
+        """Инструмент проверяется сразу, а сама выгрузка идет генератором со своей сессией:
+        сессия запроса закрывается раньше, чем ответ будет дочитан"""
+        instrument = await self.instrument_repo.get_cached_by_ticker(ticker)
+
+        if not instrument:
+            raise NotFoundException(entity_name='Instrument')
+
+        return self._export(instrument.id, ticker, export_format)
+
+    async def _export(self, instrument_id: int, ticker: str, export_format: ExportFormat) -> AsyncIterator[bytes]:
+        if export_format == ExportFormat.CSV:
+            yield b'id,ticker,amount,price,timestamp\r\n'
+
+        async with self.session_factory() as session:
+            transaction_repo = TransactionRepository(session)
+            async for rows in transaction_repo.stream_by_instrument(instrument_id):
+                if export_format == ExportFormat.CSV:
+                    yield self._to_csv(rows, ticker)
+                else:
+                    yield self._to_ndjson(rows, ticker)
+
+    @staticmethod
+    def _to_ndjson(rows: list[Row], ticker: str) -> bytes:
+        lines = [
+            TransactionHistoryResponse(ticker=ticker, **row._mapping).model_dump_json()
+            for row in rows
+        ]
+        return ('\n'.join(lines) + '\n').encode()
+
+    @staticmethod
+    def _to_csv(rows: list[Row], ticker: str) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row.id, ticker, row.amount, row.price, row.timestamp.isoformat()])
+        return buffer.getvalue().encode()
@@ -2,7 +2,14 @@ import uuid
 from utils import generate_api_key
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.data.repositories import BalanceRepository, InstrumentRepository, UserRepository, WalletRepository
+from app.data.cache import ApiKeyCache
+from app.data.repositories import (
+    BalanceRepository,
+    CacheInvalidationRepository,
+    InstrumentRepository,
+    UserRepository,
+    WalletRepository,
+)
 from app.data.models import Balance, Instrument, User, Wallet
 from app.domain.entities import UserCreate, UserResponse
 from app.domain.enums import UserRole
@@ -17,12 +24,16 @@ class UserService:
         instrument_repo: InstrumentRepository,
         user_repo: UserRepository,
         wallet_repo: WalletRepository,
+        api_key_cache: ApiKeyCache | None = None,
+        cache_invalidation: CacheInvalidationRepository | None = None,
     ):
         self.session = session
         self.balance_repo = balance_repo
         self.instrument_repo = instrument_repo
         self.user_repo = user_repo
         self.wallet_repo = wallet_repo
+        self.api_key_cache = api_key_cache
+        self.cache_invalidation = cache_invalidation
 
     async def create_user(self, user: UserCreate) -> UserResponse:
         user_dict = user.model_dump()
@@ -58,6 +69,23 @@ class UserService:
 
         return UserResponse.model_validate(user)
 
+    async def authenticate(self, api_key: str) -> UserResponse:
+        """Пользователь по api_key с кэшем процесса, в базу идем только при промахе"""
+        generation = None
+        if self.api_key_cache is not None:
+            cached_user = self.api_key_cache.get(api_key)
+            if cached_user is not None:
+                return cached_user
+            # Сброс кэша во время чтения из базы означает, что прочитанное могло устареть
+            generation = self.api_key_cache.generation
+
+        async with self.session.begin():
+            user = await self.get_user_by_api_key(api_key=api_key)
+
+        if self.api_key_cache is not None:
+            self.api_key_cache.put(api_key, user.id, user, generation=generation)
+        return user
+
     async def delete_user_by_id(self, user_id: uuid.UUID) -> UserResponse:
         user = await self.user_repo.get_by_id(id=user_id)
 
@@ -66,4 +94,13 @@ class UserService:
 
         deleted_user = await self.user_repo.delete(obj=user)
         await self.session.commit()
+        await self._invalidate_user_cache(user_id)
         return deleted_user
+
+    async def _invalidate_user_cache(self, user_id: uuid.UUID):
+        """Сбрасывает кэш аутентификации пользователя во всех процессах.
+        Вызывать при удалении пользователя и любом изменении его роли или ключа"""
+        if self.api_key_cache is not None:
+            self.api_key_cache.invalidate_user(user_id)
+        if self.cache_invalidation is not None:
+            await self.cache_invalidation.publish(ApiKeyCache.NAME, str(user_id))
@@ -55,40 +55,38 @@ class WalletService:
         if not instrument:
             raise NotFoundException(entity_name='Instrument')
 
-        instrument_balance = await self.balance_repo.get_user_balance_of_instrument(
+        await self.balance_repo.deposit(
             wallet_id=user_wallet_id,
-            instrument_id=instrument.id
+            instrument_id=instrument.id,
+            amount=deposit.amount
         )
 
-        if not instrument_balance:
-            new_balance = Balance(
-                wallet_id=user_wallet_id,
-                instrument_id=instrument.id,
-                amount=deposit.amount
-            )
-            await self.balance_repo.add(new_balance)
-        else:
-            await self.balance_repo.update_user_balance_of_instrument(
-                balance_id=instrument_balance.id,
-                amount=deposit.amount
-            )
-        
         await self.session.commit()
 
     async def withdraw(self, withdraw: Withdraw) -> None:
-        instrument_balance = await self.get_instrument_balance(
-            user_id=withdraw.user_id,
-            ticker=withdraw.ticker
-        )
+        user_wallet_id = await self.wallet_repo.get_wallet_id_by_user_id(user_id=withdraw.user_id)
+        if not user_wallet_id:
+            raise NotFoundException(entity_name='Wallet')
 
-        if not instrument_balance:
-            raise NotFoundException(entity_name='Instrument balance')
-        elif instrument_balance.amount >= withdraw.amount:
-            await self.balance_repo.update_user_balance_of_instrument(
-                balance_id=instrument_balance.id,
-                amount=withdraw.amount * -1
+        instrument = await self.instrument_repo.get_instrument_by_ticker(ticker=withdraw.ticker)
+        if not instrument:
+            raise NotFoundException(entity_name='Instrument')
+
+        # Списание только из свободного остатка, проверка и изменение - один UPDATE.
+        # Блокировка кошелька не дает ему уменьшить остаток, уже проверенный выставлением заявки
+        await self.balance_repo.lock_wallet(user_wallet_id)
+        withdrawn = await self.balance_repo.withdraw(
+            wallet_id=user_wallet_id,
+            instrument_id=instrument.id,
+            amount=withdraw.amount
+        )
+        if not withdrawn:
+            instrument_balance = await self.balance_repo.get_user_balance_of_instrument(
+                wallet_id=user_wallet_id,
+                instrument_id=instrument.id
             )
-        else:
+            if not instrument_balance:
+                raise NotFoundException(entity_name='Instrument balance')
             raise HTTPException(status_code=400, detail='Insufficient funds')
-        
+
         await self.session.commit()
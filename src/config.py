@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,11 +8,48 @@ class Settings(BaseSettings):
     POSTGRES_DB: str 
     POSTGRES_HOST: str
     POSTGRES_PORT: str
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: float = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT: int = 30000
+    DB_PREPARED_STATEMENTS: bool = True
+    DB_PREPARE_THRESHOLD: int = 5
 
     REDIS_PASSWORD: str
+    REDIS_HOST: str = 'redis'
+    REDIS_PORT: int = 6379
+    REDIS_SOCKET_PATH: str = ''
+    REDIS_POOL_SIZE: int = 50
+    REDIS_POOL_TIMEOUT: float = 5
+    REDIS_CONNECT_TIMEOUT: float = 5
+    REDIS_SOCKET_TIMEOUT: float | None = None
+
+    ORDERBOOK_MATCHING: str = 'script'
+    ORDER_SEQUENCER: str = 'matcher'
+    MATCHER_TIMEOUT: float = 5
+    MATCHING_JOURNAL_PATH: str = ''
+    MATCHING_JOURNAL_CHUNK_SIZE: int = 1 << 20
+    MATCHING_JOURNAL_FLUSH_INTERVAL: float = 0.05
+    MATCHING_JOURNAL_FSYNC: bool = False
+    TRADE_WRITER: str = 'inline'
+    TRADE_WRITER_BATCH: int = 5000
+    TRADE_WRITER_BLOCK: float = 1
+    ORDERBOOK_SNAPSHOT_TTL: float = 0.1
+    API_KEY_CACHE_TTL: float = 30
+    API_KEY_CACHE_SIZE: int = 10000
 
     ORIGINS: str
 
+    @model_validator(mode='after')
+    def check_matching(self):
+        # Стаканы в памяти верны, только пока их меняет один процесс. С очередями в каждом
+        # воркере у каждого был бы свой стакан
+        if self.ORDERBOOK_MATCHING == 'memory' and self.ORDER_SEQUENCER != 'matcher':
+            raise ValueError('ORDERBOOK_MATCHING=memory requires ORDER_SEQUENCER=matcher')
+        return self
+
     def get_db_url(self):
         return (
             f'postgresql+psycopg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@'
@@ -1,15 +1,67 @@
+import time
 from typing import AsyncGenerator
 
+from sqlalchemy.exc import TimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from config import settings
+from utils import PoolMetrics
 
 
 DATABASE_URL = settings.get_db_url()
 
 
-engine = create_async_engine(DATABASE_URL)
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений PostgreSQL, который учитывает время ожидания свободного соединения"""
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        # У QueuePool нет публичного доступа к max_overflow, поэтому он запоминается здесь
+        self.max_overflow = max_overflow
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            self.metrics.observe_timeout()
+            raise
+
+        self.metrics.observe_wait(time.perf_counter() - started)
+        return connection
+
+    def stats(self) -> dict:
+        return self.metrics.snapshot(
+            # Отрицательный max_overflow - пул без верхней границы
+            size=self.size() + max(self.max_overflow, 0),
+            in_use=self.checkedout(),
+            idle=self.checkedin(),
+        )
+
+
+def get_connect_args() -> dict:
+    connect_args = {
+        # None отключает подготовленные запросы, например за pgbouncer в режиме transaction
+        'prepare_threshold': settings.DB_PREPARE_THRESHOLD if settings.DB_PREPARED_STATEMENTS else None,
+    }
+    if settings.DB_STATEMENT_TIMEOUT:
+        connect_args['options'] = f'-c statement_timeout={settings.DB_STATEMENT_TIMEOUT}'
+    return connect_args
+
+
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=get_connect_args(),
+)
 async_session_maker = async_sessionmaker(engine)
 
 
@@ -1,13 +1,31 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
+from redis_client import close_redis, open_redis
 from app.api.routers import api_router
 from app.api.exceptions import set_exceptions
+from app.dependencies.caches import listen_cache_invalidation, warm_caches
+from app.dependencies.service_factories import orderbook_broadcaster
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_redis()
+    await warm_caches()
+    cache_listener = asyncio.create_task(listen_cache_invalidation())
+    yield
+    cache_listener.cancel()
+    await orderbook_broadcaster.close()
+    await close_redis()
 
 
 app = FastAPI(
-    title='My Title'
+    title='My Title',
+    lifespan=lifespan,
 )
 
 set_exceptions(app)
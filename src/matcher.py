@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+
+from config import settings
+from database import async_session_maker
+from redis_client import close_redis, open_redis
+from app.data.repositories import MatcherQueueRepository, OrderBookRepository, OrderRepository
+from app.data.repositories.redis_orderbook import ORDERBOOK_LAYOUT
+from app.dependencies.caches import instrument_cache, listen_cache_invalidation, warm_caches
+from app.dependencies.service_factories import get_order_service, matching_engine, matching_journal
+from app.domain.enums import MatchingMode, OrderDirection
+from app.domain.matching import BookOrder, MatchingJournal, OrderBook, TickerSequencer
+from app.domain.matching.dispatcher import execute_command
+
+
+logger = logging.getLogger(__name__)
+
+async def process_command(
+    command: dict,
+    sequencer: TickerSequencer,
+    matcher_queue: MatcherQueueRepository,
+):
+    async def operation() -> dict | None:
+        # Клиент ждет ответ до deadline, после этого он снимает команду: она не должна
+        # выполниться, иначе клиент получит ошибку по уже выставленной заявке
+        if time.time() > command['deadline'] or not await matcher_queue.start_command(command['request_id']):
+            return None
+
+        async with async_session_maker() as session:
+            order_service = get_order_service(session)
+            return await execute_command(order_service, command)
+
+    try:
+        reply = await sequencer.submit(command['ticker'], operation)
+    except Exception:
+        logger.exception('Command %s failed', command['request_id'])
+        reply = {'ok': False, 'status_code': 500, 'detail': 'Internal server error'}
+
+    if reply is not None:
+        await matcher_queue.push_reply(command['request_id'], reply)
+
+
+async def wait_for_orderbook(orderbook: OrderBookRepository):
+    """Ждет, пока app соберет стаканы в текущей раскладке (rebuild_orderbook --if-outdated)"""
+    while await orderbook.get_layout() != ORDERBOOK_LAYOUT:
+        logger.info('Waiting for orderbooks to be rebuilt')
+        await asyncio.sleep(1)
+
+
+async def open_journal(journal: MatchingJournal, orderbook: OrderBookRepository):
+    """Восстанавливает стаканы движка из журнала. Новый журнал, как и журнал, начатый до
+    пересборки стаканов в Redis, начинается со стаканов из Redis.
+
+    Журнал дописывается после коммита, а Redis меняется до него, поэтому после сбоя оба
+    могут расходиться с Postgres. Стаканы сверяются с активными заявками в Postgres
+    и заново записываются в Redis"""
+    # В остальных режимах стаканы живут только в Redis, и восстановленные из журнала некуда деть
+    if MatchingMode(settings.ORDERBOOK_MATCHING) != MatchingMode.MEMORY:
+        raise RuntimeError('MATCHING_JOURNAL_PATH requires ORDERBOOK_MATCHING=memory')
+
+    epoch = await orderbook.get_rebuilt()
+    books = journal.open(epoch)
+    if books is None:
+        matching_engine.reset()
+        books = {
+            ticker: await matching_engine.get_book(ticker, orderbook)
+            for ticker in instrument_cache.tickers()
+        }
+        logger.info('Matching journal started from Redis')
+
+    await reconcile_books(books)
+    journal.compact(books, epoch)
+    for book in books.values():
+        await orderbook.replace_orders(book.ticker, [
+            (order.order_id, order.user_id, order.direction, order.price, order.qty)
+            for order in book.orders()
+        ])
+
+    matching_engine.restore(books)
+    logger.info('Matching journal restored: %d orders', sum(len(book.orders()) for book in books.values()))
+
+
+async def reconcile_books(books: dict[str, OrderBook]):
+    """Приводит стаканы к активным лимитным заявкам в Postgres, недостающие стаканы добавляются в books"""
+    async with async_session_maker() as session:
+        rows = await OrderRepository(session).get_book_orders()
+
+    orders: dict[str, list[BookOrder]] = {}
+    for ticker, order_id, user_id, direction, price, remaining in rows:
+        orders.setdefault(ticker, []).append(BookOrder(
+            order_id=str(order_id),
+            user_id=str(user_id),
+            direction=OrderDirection(direction),
+            price=price,
+            qty=remaining,
+        ))
+
+    for ticker in {*books, *orders, *instrument_cache.tickers()}:
+        book = books.setdefault(ticker, OrderBook(ticker))
+        changed = book.reconcile(orders.get(ticker, []))
+        if changed:
+            logger.warning('Orderbook %s differed from Postgres in %d orders, fixed', ticker, changed)
+
+
+async def flush_journal(journal: MatchingJournal):
+    while True:
+        await asyncio.sleep(settings.MATCHING_JOURNAL_FLUSH_INTERVAL)
+        journal.flush()
+
+
+async def run_matcher():
+    redis = open_redis()
+    matcher_queue = MatcherQueueRepository(redis=redis)
+    sequencer = TickerSequencer()
+    tasks = set()
+
+    await wait_for_orderbook(OrderBookRepository(redis=redis))
+    await warm_caches()
+    cache_listener = asyncio.create_task(listen_cache_invalidation())
+
+    if matching_journal is not None:
+        await open_journal(matching_journal, OrderBookRepository(redis=redis))
+        journal_flusher = asyncio.create_task(flush_journal(matching_journal))
+
+    logger.info('Matcher started')
+    try:
+        while True:
+            command = await matcher_queue.pop_command()
+            if command is None:
+                continue
+
+            # Команды разных инструментов обрабатываются параллельно, одного - по очереди
+            task = asyncio.create_task(process_command(command, sequencer, matcher_queue))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        cache_listener.cancel()
+        await sequencer.close()
+        if matching_journal is not None:
+            journal_flusher.cancel()
+            matching_journal.close()
+        await close_redis()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    asyncio.run(run_matcher())
@@ -1,4 +1,5 @@
 import asyncio
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import pool
@@ -11,8 +12,10 @@ from database import Base
 
 from app.data.models import (
     Balance,
+    Candle,
     Instrument,
     Order,
+    TradeOutbox,
     Transaction,
     User,
     Wallet,
@@ -32,6 +35,15 @@ config.set_main_option('sqlalchemy.url', settings.get_db_url())
 
 target_metadata = Base.metadata
 
+# Секции transactions создаются миграцией и scripts/partition_transactions.py, в моделях их нет
+TRANSACTION_PARTITION = re.compile(r'transactions_y\d{4}m\d{2}')
+
+
+def include_name(name, type_, parent_names) -> bool:
+    if type_ == 'table':
+        return not TRANSACTION_PARTITION.fullmatch(name)
+    return True
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
@@ -49,6 +61,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -58,7 +71,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_name=include_name)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,63 @@
+"""Indexes for hot queries
+
+Revision ID: a3c9e1f27b64
+Revises: 5d7ce1e45862
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9e1f27b64'
+down_revision: Union[str, None] = '5d7ce1e45862'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Перед уникальным ограничением сливаем дубли балансов в строку с меньшим id
+    op.execute("""
+        WITH merged AS (
+            SELECT min(id) AS keep_id, sum(amount) AS amount, sum(reserved) AS reserved
+            FROM balances
+            GROUP BY wallet_id, instrument_id
+            HAVING count(*) > 1
+        )
+        UPDATE balances
+        SET amount = merged.amount, reserved = merged.reserved
+        FROM merged
+        WHERE balances.id = merged.keep_id
+    """)
+    op.execute("""
+        DELETE FROM balances
+        USING balances AS kept
+        WHERE balances.wallet_id = kept.wallet_id
+          AND balances.instrument_id = kept.instrument_id
+          AND balances.id > kept.id
+    """)
+    op.create_unique_constraint('uq_balances_wallet_id_instrument_id', 'balances', ['wallet_id', 'instrument_id'])
+
+    op.create_index(
+        'ix_orders_user_id_timestamp_open',
+        'orders',
+        ['user_id', 'timestamp'],
+        unique=False,
+        postgresql_where=sa.text("status IN ('NEW', 'PARTIALLY_EXECUTED')"),
+    )
+    op.create_index('ix_transactions_instrument_id_timestamp', 'transactions', ['instrument_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_instrument_id_timestamp', table_name='transactions')
+    op.drop_index(
+        'ix_orders_user_id_timestamp_open',
+        table_name='orders',
+        postgresql_where=sa.text("status IN ('NEW', 'PARTIALLY_EXECUTED')"),
+    )
+    op.drop_constraint('uq_balances_wallet_id_instrument_id', 'balances', type_='unique')
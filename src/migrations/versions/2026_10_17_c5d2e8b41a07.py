@@ -0,0 +1,95 @@
+"""Partition transactions by month
+
+Revision ID: c5d2e8b41a07
+Revises: 71fa82cf3161
+Create Date: 2026-10-17 21:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2e8b41a07'
+down_revision: Union[str, None] = '71fa82cf3161'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = 'id, instrument_id, wallet_id, amount, price, timestamp'
+
+
+def create_transactions_table(primary_key: sa.PrimaryKeyConstraint, **kwargs) -> None:
+    op.create_table('transactions',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('transactions_id_seq')"), nullable=False),
+    sa.Column('instrument_id', sa.Integer(), nullable=False),
+    sa.Column('wallet_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['instrument_id'], ['instruments.id'], name='transactions_instrument_id_fkey', ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], name='transactions_wallet_id_fkey', ondelete='CASCADE'),
+    primary_key,
+    **kwargs,
+    )
+    op.execute('ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id')
+    op.create_index('ix_transactions_instrument_id_timestamp', 'transactions', ['instrument_id', 'timestamp'], unique=False)
+
+
+def rename_old_transactions_table() -> None:
+    # Сиквенс переживает старую таблицу, чтобы id продолжались
+    op.execute('ALTER SEQUENCE transactions_id_seq OWNED BY NONE')
+    op.rename_table('transactions', 'transactions_old')
+    op.execute('ALTER TABLE transactions_old RENAME CONSTRAINT transactions_pkey TO transactions_old_pkey')
+    op.execute('ALTER INDEX ix_transactions_instrument_id_timestamp RENAME TO ix_transactions_old_instrument_id_timestamp')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    rename_old_transactions_table()
+
+    create_transactions_table(
+        sa.PrimaryKeyConstraint('id', 'timestamp', name='transactions_pkey'),
+        postgresql_partition_by='RANGE (timestamp)',
+    )
+
+    # Секции по месяцам (UTC) с начала истории и на три месяца вперед, дальше их создает
+    # scripts/partition_transactions.py. DEFAULT-секции нет: с ней PostgreSQL не может читать
+    # секции по порядку, и запрос последних сделок перебирал бы индексы всех месяцев
+    op.execute("""
+        DO $$
+        DECLARE
+            month timestamptz;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce((SELECT min(timestamp) FROM transactions_old), now()), 'UTC'),
+                    date_trunc('month', now(), 'UTC') + interval '3 months',
+                    interval '1 month'
+                )
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+                    'transactions_' || to_char(month AT TIME ZONE 'UTC', '"y"YYYY"m"MM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+    """)
+
+    op.execute(f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_old')
+    op.drop_table('transactions_old')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    rename_old_transactions_table()
+
+    create_transactions_table(sa.PrimaryKeyConstraint('id', name='transactions_pkey'))
+
+    op.execute(f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_old')
+    # Вместе с секционированной таблицей удаляются все ее секции
+    op.drop_table('transactions_old')
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from config import settings
+
+
+DATABASE_URL = settings.get_db_url()
+
+engine = create_async_engine(DATABASE_URL)
+
+
+# Горячие запросы репозиториев в том виде, в каком их строит SQLAlchemy
+QUERIES = {
+    'OrderRepository.get_user_orders': """
+        SELECT * FROM orders
+        WHERE user_id = (SELECT user_id FROM wallets ORDER BY id LIMIT 1)
+          AND (status = 'NEW' OR status = 'PARTIALLY_EXECUTED')
+        ORDER BY timestamp DESC
+    """,
+    'TransactionRepository.get_all_transactions_by_instrument': """
+        SELECT * FROM transactions
+        WHERE instrument_id = (SELECT min(id) FROM instruments)
+        ORDER BY timestamp DESC
+        LIMIT 10
+    """,
+    'BalanceRepository.get_user_balance_of_instrument': """
+        SELECT * FROM balances
+        WHERE wallet_id = (SELECT max(id) FROM wallets)
+          AND instrument_id = (SELECT min(id) FROM instruments)
+        FOR UPDATE
+    """,
+    'WalletRepository.get_wallet_id_by_user_id': """
+        SELECT id FROM wallets
+        WHERE user_id = (SELECT user_id FROM wallets ORDER BY id DESC LIMIT 1)
+    """,
+}
+
+
+async def seed(conn: AsyncConnection, users: int, orders: int, transactions: int):
+    """Синтетические данные: у каждого пользователя кошелек и баланс по каждому
+    инструменту, заявки в основном уже исполнены или отменены"""
+    print(f'Seeding {users} users, {orders} orders, {transactions} transactions...')
+
+    await conn.execute(text("""
+        INSERT INTO instruments (ticker, name)
+        SELECT 'BENCH' || n, 'Benchmark ' || n FROM generate_series(1, 20) AS n
+        ON CONFLICT (ticker) DO NOTHING
+    """))
+    await conn.execute(text("""
+        INSERT INTO users (name, role, api_key)
+        SELECT 'bench' || n, 'USER', 'bench-' || gen_random_uuid() FROM generate_series(1, :users) AS n
+    """), {'users': users})
+    await conn.execute(text("""
+        INSERT INTO wallets (user_id)
+        SELECT id FROM users WHERE NOT EXISTS (SELECT 1 FROM wallets WHERE wallets.user_id = users.id)
+    """))
+    await conn.execute(text("""
+        INSERT INTO balances (wallet_id, instrument_id, amount)
+        SELECT wallets.id, instruments.id, 1000
+        FROM wallets CROSS JOIN instruments
+        WHERE NOT EXISTS (
+            SELECT 1 FROM balances
+            WHERE balances.wallet_id = wallets.id AND balances.instrument_id = instruments.id
+        )
+    """))
+    await conn.execute(text("""
+        WITH u AS (SELECT array_agg(id) AS ids FROM users),
+             i AS (SELECT array_agg(id) AS ids FROM instruments)
+        INSERT INTO orders (user_id, instrument_id, order_type, status, direction, qty, price, filled, timestamp)
+        SELECT
+            u.ids[1 + floor(random() * array_length(u.ids, 1))::int],
+            i.ids[1 + floor(random() * array_length(i.ids, 1))::int],
+            'LIMIT',
+            CASE WHEN random() < 0.05 THEN 'NEW' WHEN random() < 0.5 THEN 'EXECUTED' ELSE 'CANCELLED' END,
+            CASE WHEN random() < 0.5 THEN 'BUY' ELSE 'SELL' END,
+            10, 100, 0,
+            now() - random() * interval '30 days'
+        FROM generate_series(1, :orders), u, i
+    """), {'orders': orders})
+    await conn.execute(text("""
+        WITH w AS (SELECT array_agg(id) AS ids FROM wallets),
+             i AS (SELECT array_agg(id) AS ids FROM instruments)
+        INSERT INTO transactions (instrument_id, wallet_id, amount, price, timestamp)
+        SELECT
+            i.ids[1 + floor(random() * array_length(i.ids, 1))::int],
+            w.ids[1 + floor(random() * array_length(w.ids, 1))::int],
+            1, 100,
+            now() - random() * interval '30 days'
+        FROM generate_series(1, :transactions), w, i
+    """), {'transactions': transactions})
+    await conn.execute(text('ANALYZE'))
+
+
+async def explain(conn: AsyncConnection):
+    for name, query in QUERIES.items():
+        result = await conn.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {query}'))
+        print(f'--- {name}')
+        for (line,) in result:
+            print(line)
+        print()
+
+
+async def explain_queries(args: argparse.Namespace):
+    async with engine.connect() as conn:
+        if args.seed:
+            await seed(conn, args.users, args.orders, args.transactions)
+            await conn.commit()
+
+        await explain(conn)
+        await conn.rollback()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Планы горячих запросов. Запустите до и после `alembic upgrade`, чтобы сравнить'
+    )
+    parser.add_argument('--seed', action='store_true', help='сначала заполнить базу синтетическими данными')
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--orders', type=int, default=500_000)
+    parser.add_argument('--transactions', type=int, default=500_000)
+    args = parser.parse_args()
+
+    if args.seed:
+        confirm = input('WARNING: This will INSERT benchmark data into the database. Are you sure? [y/n]: ')
+        if confirm.lower() != 'y':
+            print('Operation cancelled.')
+            exit()
+
+    asyncio.run(explain_queries(args))
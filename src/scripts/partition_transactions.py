@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import re
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from config import settings
+
+
+DATABASE_URL = settings.get_db_url()
+
+engine = create_async_engine(DATABASE_URL)
+
+
+PARENT = 'transactions'
+PARTITION_NAME = re.compile(r'transactions_y(\d{4})m(\d{2})')
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{PARENT}_y{month.year:04d}m{month.month:02d}'
+
+
+async def get_partitions(conn: AsyncConnection) -> dict[datetime, str]:
+    """Месячные секции transactions по началу месяца"""
+    result = await conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = CAST(:parent AS regclass)
+    """), {'parent': PARENT})
+
+    partitions = {}
+    for (name,) in result:
+        match = PARTITION_NAME.fullmatch(name)
+        if match:
+            month = datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+            partitions[month] = name
+    return partitions
+
+
+async def create_partition(conn: AsyncConnection, month: datetime):
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+
+    async with conn.begin():
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+
+    print(f'Created {name}')
+
+
+async def archive_partition(conn: AsyncConnection, name: str, schema: str | None):
+    """Отсоединяет секцию и переносит ее в схему архива, либо удаляет при schema=None"""
+    async with conn.begin():
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION {name}'))
+        if schema is None:
+            await conn.execute(text(f'DROP TABLE {name}'))
+        else:
+            await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS {schema}'))
+            await conn.execute(text(f'ALTER TABLE {name} SET SCHEMA {schema}'))
+
+    print(f'Dropped {name}' if schema is None else f'Archived {name} to {schema}.{name}')
+
+
+def get_current_month() -> datetime:
+    return datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+async def check_coverage(months: int):
+    """Предупреждает, если секции наперед кончаются раньше чем через months месяцев"""
+    current_month = get_current_month()
+    async with engine.connect() as conn:
+        partitions = await get_partitions(conn)
+
+    covered = 0
+    while add_months(current_month, covered) in partitions:
+        covered += 1
+    if covered <= months:
+        end = add_months(current_month, covered)
+        print(
+            f'WARNING: transactions partitions end at {end:%Y-%m}, trades from then on will fail to insert',
+            file=sys.stderr,
+        )
+
+
+async def partition_transactions(args: argparse.Namespace):
+    current_month = get_current_month()
+
+    async with engine.connect() as conn:
+        partitions = await get_partitions(conn)
+        await conn.rollback()
+
+        for months in range(args.ahead + 1):
+            month = add_months(current_month, months)
+            if month not in partitions:
+                await create_partition(conn, month)
+
+        if args.retain is not None:
+            oldest_kept = add_months(current_month, -args.retain)
+            for month, name in sorted(partitions.items()):
+                if month < oldest_kept:
+                    await archive_partition(conn, name, None if args.drop else args.schema)
+
+
+async def maintain_partitions(args: argparse.Namespace):
+    """Обслуживание один раз или раз в args.every секунд. Сбой запуска не останавливает цикл,
+    а нехватка секций наперед видна в логе до того, как сделки перестанут записываться"""
+    while True:
+        try:
+            await partition_transactions(args)
+        except Exception as exc:
+            print(f'Partition maintenance failed: {exc!r}', file=sys.stderr)
+
+        try:
+            await check_coverage(args.warn)
+        except Exception as exc:
+            print(f'Partition check failed: {exc!r}', file=sys.stderr)
+
+        if args.every is None:
+            break
+        await asyncio.sleep(args.every)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Создает месячные секции transactions наперед и архивирует старые. Запускается при старте '
+                    'app и сервисом partitions раз в сутки: секции по умолчанию нет, и сделки за месяц без '
+                    'секции не запишутся'
+    )
+    parser.add_argument('--ahead', type=int, default=12, help='на сколько месяцев вперед создавать секции')
+    parser.add_argument('--retain', type=int, default=None, help='сколько месяцев истории оставлять, без него ничего не архивируется')
+    parser.add_argument('--schema', default='archive', help='схема для отсоединенных секций')
+    parser.add_argument('--drop', action='store_true', help='удалять старые секции вместо переноса в архив')
+    parser.add_argument('--every', type=int, default=None, help='повторять раз в столько секунд, без него - один запуск')
+    parser.add_argument('--warn', type=int, default=2, help='предупреждать, если секций наперед не больше стольких месяцев')
+    args = parser.parse_args()
+
+    if args.retain is not None and args.drop:
+        confirm = input(f'WARNING: This will DROP transactions older than {args.retain} months. Are you sure? [y/n]: ')
+        if confirm.lower() != 'y':
+            print('Operation cancelled.')
+            exit()
+
+    asyncio.run(maintain_partitions(args))
@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config import settings
+from redis_client import close_redis, open_redis
+from app.data.models import Instrument, Order
+from app.data.repositories.redis_orderbook import (
+    LAYOUT_KEY,
+    ORDERBOOK_LAYOUT,
+    REBUILT_KEY,
+    book_key,
+    events_channel,
+    make_member,
+    member_order_id,
+    order_key,
+    seq_key,
+    side_keys,
+    version_key,
+)
+from app.domain.enums import OrderDirection, OrderStatus, OrderType
+
+
+DATABASE_URL = settings.get_db_url()
+
+engine = create_async_engine(DATABASE_URL)
+
+
+class TickerLoader:
+    """Переносит заявки одного инструмента в Redis. Номера в очереди раздаются по времени
+    выставления, объемы уровней копятся в памяти и записываются в конце"""
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.seq = 0
+        self.orders = 0
+        self.depth = {direction: {} for direction in OrderDirection}
+
+    def add_batch(self, pipe, rows):
+        members = {direction: {} for direction in OrderDirection}
+        for order_id, user_id, direction, price, qty, filled, status, timestamp in rows:
+            remaining = qty - filled
+            if remaining <= 0:
+                continue
+
+            self.seq += 1
+            self.orders += 1
+            order_id = str(order_id)
+            direction = OrderDirection(direction)
+            member = make_member(direction, self.seq, order_id)
+            members[direction][member] = price
+            self.depth[direction][price] = self.depth[direction].get(price, 0) + remaining
+
+            # Как в rest_order: в qty хранится остаток, filled обнуляется
+            pipe.hset(order_key(self.ticker, order_id), mapping={
+                'ticker': self.ticker,
+                'direction': direction,
+                'price': price,
+                'qty': remaining,
+                'filled': '0',
+                'user_id': str(user_id),
+                'status': status,
+                'timestamp': str(timestamp.timestamp()),
+                'member': member,
+            })
+
+        for direction, side_members in members.items():
+            if side_members:
+                pipe.zadd(book_key(self.ticker, direction), side_members)
+
+    def finish(self, pipe):
+        for direction, levels in self.depth.items():
+            _, depth_key, levels_key = side_keys(self.ticker, direction)
+            if levels:
+                pipe.hset(depth_key, mapping=levels)
+                pipe.zadd(levels_key, {price: price for price in levels})
+
+        pipe.set(seq_key(self.ticker), self.seq)
+        pipe.incr(version_key(self.ticker))
+        # Подписчики стакана заново запрашивают снимок
+        pipe.publish(events_channel(self.ticker), json.dumps({'type': 'resync', 'ticker': self.ticker}))
+
+
+async def clear_ticker(redis, ticker: str, batch: int):
+    """Удаляет стакан инструмента вместе с хешами заявок"""
+    for direction in OrderDirection:
+        await clear_side(redis, side_keys(ticker, direction), lambda order_id: order_key(ticker, order_id), batch)
+
+        # Стакан в исходной раскладке без hash tag, из которой заявки переносятся этой же сборкой
+        await clear_side(redis, [f'orderbook:{ticker}:{direction.value}'], lambda order_id: f'order:{order_id}', batch)
+
+
+async def clear_side(redis, keys: list[str], make_order_key, batch: int):
+    book, *aggregates = keys
+    total = await redis.zcard(book)
+    for start in range(0, total, batch):
+        members = await redis.zrange(book, start, start + batch - 1)
+        await redis.unlink(*(make_order_key(member_order_id(member)) for member in members))
+    await redis.unlink(book, *aggregates)
+
+
+async def rebuild_orderbook(args: argparse.Namespace):
+    redis = open_redis()
+    started = time.perf_counter()
+
+    if args.if_outdated and await redis.get(LAYOUT_KEY) == str(ORDERBOOK_LAYOUT):
+        print('Orderbooks are up to date')
+        await close_redis()
+        await engine.dispose()
+        return
+
+    async with engine.connect() as conn:
+        query = select(Instrument.id, Instrument.ticker)
+        if args.tickers:
+            query = query.where(Instrument.ticker.in_(args.tickers))
+        tickers = dict((await conn.execute(query)).all())
+
+        await asyncio.gather(*(clear_ticker(redis, ticker, args.batch) for ticker in tickers.values()))
+
+        loaders = {instrument_id: TickerLoader(ticker) for instrument_id, ticker in tickers.items()}
+        semaphore = asyncio.Semaphore(args.jobs)
+        pending = set()
+
+        async def execute(pipe):
+            try:
+                await pipe.execute()
+            finally:
+                semaphore.release()
+
+        # Один серверный курсор по всем активным заявкам, пачки уходят в Redis параллельно
+        result = await conn.stream(
+            select(
+                Order.instrument_id,
+                Order.id,
+                Order.user_id,
+                Order.direction,
+                Order.price,
+                Order.qty,
+                Order.filled,
+                Order.status,
+                Order.timestamp,
+            )
+            .where(
+                Order.instrument_id.in_(list(tickers)),
+                Order.order_type == OrderType.LIMIT,
+                Order.status.in_([OrderStatus.NEW, OrderStatus.PARTIALLY_EXECUTED]),
+            )
+            .order_by(Order.instrument_id, Order.timestamp, Order.id)
+            .execution_options(yield_per=args.batch)
+        )
+        async for partition in result.partitions():
+            batches = {}
+            for instrument_id, *row in partition:
+                batches.setdefault(instrument_id, []).append(row)
+
+            for instrument_id, rows in batches.items():
+                await semaphore.acquire()
+                pipe = redis.pipeline(transaction=False)
+                loaders[instrument_id].add_batch(pipe, rows)
+                task = asyncio.create_task(execute(pipe))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+        await asyncio.gather(*pending)
+
+    pipe = redis.pipeline(transaction=False)
+    for loader in loaders.values():
+        loader.finish(pipe)
+    # Раскладка отмечается только после сборки всех стаканов
+    if not args.tickers:
+        pipe.set(LAYOUT_KEY, ORDERBOOK_LAYOUT)
+    pipe.set(REBUILT_KEY, time.time_ns())
+    await pipe.execute()
+
+    for loader in loaders.values():
+        print(f'{loader.ticker}: {loader.orders} orders')
+    print(f'Done in {time.perf_counter() - started:.1f}s')
+
+    await close_redis()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Заново собирает стаканы в Redis по активным заявкам из Postgres. Запускать при '
+                    'остановленных app и matcher: заявки, пришедшие во время сборки, потеряются'
+    )
+    parser.add_argument('tickers', nargs='*', help='тикеры для сборки, по умолчанию все')
+    parser.add_argument('--batch', type=int, default=10000, help='сколько заявок читать и отправлять в Redis за раз')
+    parser.add_argument('--jobs', type=int, default=8, help='сколько пачек одновременно отправлять в Redis')
+    parser.add_argument(
+        '--if-outdated',
+        action='store_true',
+        help='собрать все стаканы без подтверждения, только если раскладка в Redis устарела или ее нет. '
+             'Запускается при старте app перед gunicorn',
+    )
+    args = parser.parse_args()
+
+    if args.if_outdated:
+        args.tickers = []
+        asyncio.run(rebuild_orderbook(args))
+        raise SystemExit
+
+    confirm = input('WARNING: This will REPLACE orderbooks in Redis. Are you sure? [y/n]: ')
+    if confirm.lower() == 'y':
+        asyncio.run(rebuild_orderbook(args))
+    else:
+        print('Operation cancelled.')
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import async_session_maker
+from app.data.repositories import CandleRepository, TradeOutboxRepository, TransactionRepository
+
+
+logger = logging.getLogger(__name__)
+
+
+async def write_transactions(session: AsyncSession, entries: list[tuple[datetime, list[dict]]]):
+    """Вставляет сделки через COPY и дописывает их в свечи одним upsert'ом"""
+    transactions = [
+        {**transaction, 'timestamp': timestamp}
+        for timestamp, entry_transactions in entries
+        for transaction in entry_transactions
+    ]
+    await TransactionRepository(session).copy_many(transactions)
+    await CandleRepository(session).add_timed_trades([
+        (transaction['instrument_id'], transaction['price'], transaction['amount'], transaction['timestamp'])
+        for transaction in transactions
+    ])
+
+
+async def write_outbox(limit: int) -> int:
+    """Переносит до limit записей trade_outbox в transactions и свечи одной транзакцией.
+    Возвращает число перенесенных записей"""
+    async with async_session_maker() as session:
+        async with session.begin():
+            entries = await TradeOutboxRepository(session).take(limit)
+            await write_transactions(session, [(entry.timestamp, entry.transactions) for entry in entries])
+    return len(entries)
+
+
+async def write_outbox_one_by_one(count: int):
+    """После сбоя пачки записи переносятся по одной до первой сбойной. Она получает неудачную
+    попытку и после MAX_ATTEMPTS пропускается, чтобы не задерживать остальные"""
+    for _ in range(count):
+        try:
+            if not await write_outbox(1):
+                return
+        except Exception:
+            try:
+                async with async_session_maker() as session:
+                    async with session.begin():
+                        failed = await TradeOutboxRepository(session).mark_first_failed()
+            except Exception:
+                # База недоступна целиком, попытки не засчитываются
+                logger.exception('Trade outbox is unavailable')
+                return
+            if failed is None:
+                return
+
+            entry_id, attempts = failed
+            if attempts >= TradeOutboxRepository.MAX_ATTEMPTS:
+                logger.exception(
+                    'Trade outbox entry %s skipped after %s attempts, reset its attempts to retry', entry_id, attempts
+                )
+            else:
+                logger.exception('Trade outbox entry %s failed, attempt %s', entry_id, attempts)
+            return
+
+
+async def run_trade_writer():
+    logger.info('Trade writer started')
+    while True:
+        try:
+            written = await write_outbox(settings.TRADE_WRITER_BATCH)
+        except Exception:
+            logger.exception('Trade batch failed, writing its entries one by one')
+            await write_outbox_one_by_one(settings.TRADE_WRITER_BATCH)
+            await asyncio.sleep(settings.TRADE_WRITER_BLOCK)
+            continue
+
+        if written < settings.TRADE_WRITER_BATCH:
+            await asyncio.sleep(settings.TRADE_WRITER_BLOCK)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    asyncio.run(run_trade_writer())
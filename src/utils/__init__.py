@@ -1 +1,2 @@
 from .auth import generate_api_key
+from .metrics import PoolMetrics
@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class PoolMetrics:
+    """Счетчики выдачи соединений из пула: сколько раз и как долго ждали свободное соединение"""
+
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+    def observe_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def observe_timeout(self):
+        self.timeouts += 1
+
+    def snapshot(self, size: int, in_use: int, idle: int) -> dict:
+        return {
+            'size': size,
+            'in_use': in_use,
+            'idle': idle,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+            'wait_max_ms': self.wait_max * 1000,
+        }